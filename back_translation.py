@@ -1,4 +1,5 @@
 import argparse, json
+from multiprocessing import Pool
 from semql.core.ast import Operation
 from semql.to_text.db_meta import DB_META_MAP
 from semql.to_text.generator import generator
@@ -7,15 +8,56 @@ from semql.from_sql.convert_json_to_OT import Converter
 from semql_data.data_helper import get_metadata_filepath_for_db
 from utils.comparisons import comp_eq
 from utils.parse_ot_str import translate_str_to_OT
+from utils.ot_cache import SQL2OTCache, DEFAULT_CACHE_PATH
+from utils.jsonl import iter_lines, count_records, iter_batches, loads_record, dumps_record, JsonlWriter
 
 from tqdm import tqdm
 
+# BackTranslation instance of a pool worker, created once per process by `_init_worker` so that the schemas,
+# the attribute metadata and DB_META_MAP stay loaded for all samples the worker processes.
+_worker_bt = None
+
+
+def _init_worker(ot_cache_path):
+    global _worker_bt
+    _worker_bt = BackTranslation(ot_cache_path=ot_cache_path)
+
+
+def _translate_line(args):
+    line, dataset = args
+    return _worker_bt.translate_line(line, dataset)
+
 
 class BackTranslation:
 
-    def __init__(self):
+    def __init__(self, workers: int = 1, chunksize: int = 4, ot_cache_path: str = DEFAULT_CACHE_PATH):
+        """
+        :param workers: Number of processes used for back-translation. With workers > 1 the samples are sharded
+                        across a process pool, the output is still written in the order of the input file.
+        :param chunksize: Number of samples sent to a worker at once.
+        :param ot_cache_path: Path of the persistent SQL to OT cache, None disables the cache.
+        """
         self.schemas, self.db_names, self.tables = get_schemas_from_json("tables.json")
         self.all_attributes_for_entity_type = {}
+        self.ot_cache_path = ot_cache_path
+        self.ot_cache = SQL2OTCache(ot_cache_path) if ot_cache_path is not None else None
+        self.workers = workers
+        self.chunksize = chunksize
+        self._pool = None
+
+    def _get_pool(self) -> Pool:
+        # the pool is kept alive between calls to back_translate, so the workers stay warm across files
+        if self._pool is None:
+            self._pool = Pool(self.workers, initializer=_init_worker, initargs=(self.ot_cache_path,))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self.ot_cache is not None:
+            self.ot_cache.close()
 
     def str_to_ot(self, in_str, db_name, dataset):
         if dataset == 'spider':
@@ -27,16 +69,20 @@ class BackTranslation:
 
 
     def convert_sql(self, sql_statement, db_name):
+        if self.ot_cache is None:
+            try:
+                return self._convert_sql(sql_statement, db_name)
+            except Exception as e:
+                return None
+        return self.ot_cache.get_or_convert(db_name, sql_statement, lambda sql: self._convert_sql(sql, db_name))
+
+    def _convert_sql(self, sql_statement, db_name):
         schema = self.schemas[db_name]
         table = self.tables[db_name]
         schema = Schema(schema, table)
-        try:
-            sql_label = get_sql(schema, sql_statement)
-            c = Converter(schema, db_name, self.all_attributes_for_entity_type[db_name])
-            ot = c(sql_label)
-            return ot
-        except Exception as e:
-            return None
+        sql_label = get_sql(schema, sql_statement)
+        c = Converter(schema, db_name, self.all_attributes_for_entity_type[db_name])
+        return c(sql_label)
 
 
     def ot_to_text(self, ot: Operation, db_name):
@@ -54,52 +100,74 @@ class BackTranslation:
                 self.all_attributes_for_entity_type[db_name] = json.load(ifile)
 
 
-    def back_translate(self, in_fname, out_fname, dataset):
-        with open(in_fname, 'rt', encoding='utf-8') as fin, open(out_fname, 'wt', encoding='utf-8') as fout:
-            for line in tqdm(fin.readlines(), desc=f'Backtranslation for {in_fname}'):
-                jdict = json.loads(line.replace('\n', ''))
-
-                beams = jdict['beams']
-                db_name = jdict['db_name']
-                self.add_attribute_meta(db_name)
-                correct_code = beams[0]['correct_code']
-                ot = self.str_to_ot(correct_code, db_name, dataset)
-                if ot is not None:
-                    jdict['gold_sql2ot_fail'] = False
-                else:
-                    continue
-                gold_ot_str = self.ot_to_text(ot, db_name)
-                if gold_ot_str is not None:
-                    jdict['gold_ot3_fail'] = False
+    def translate_line(self, line, dataset):
+        """
+        Back-translates a single sample (one line of the input file).
+        :return: The serialized sample including the back-translations or None if the gold query cannot be converted.
+        """
+        jdict = loads_record(line)
+
+        beams = jdict['beams']
+        db_name = jdict['db_name']
+        self.add_attribute_meta(db_name)
+        correct_code = beams[0]['correct_code']
+        ot = self.str_to_ot(correct_code, db_name, dataset)
+        if ot is not None:
+            jdict['gold_sql2ot_fail'] = False
+        else:
+            return None
+        gold_ot_str = self.ot_to_text(ot, db_name)
+        if gold_ot_str is not None:
+            jdict['gold_ot3_fail'] = False
+        else:
+            return None
+
+        for beam in beams:
+            inferred_code = beam['inferred_code']
+            inferred_ot = self.str_to_ot(inferred_code, db_name, dataset)
+            if inferred_ot is None:
+                #cannot convert SQL
+                beam['is_correct_ot'] = False
+                beam['inferred_question'] = ""
+                beam['beam_sql2ot_fail'] = True
+            else:
+                beam['beam_sql2ot_fail'] = False
+                comp_eq_score = comp_eq(ot, inferred_ot)
+                inferred_ot_str = self.ot_to_text(inferred_ot, db_name)
+                if inferred_ot_str is None:
+                    beam['beam_ot3_fail'] = True
                 else:
-                    continue
-
-                for beam in beams:
-                    inferred_code = beam['inferred_code']
-                    inferred_ot = self.str_to_ot(inferred_code, db_name, dataset)
-                    if inferred_ot is None:
-                        #cannot convert SQL
-                        beam['is_correct_ot'] = False
-                        beam['inferred_question'] = ""
-                        beam['beam_sql2ot_fail'] = True
-                    else:
-                        beam['beam_sql2ot_fail'] = False
-                        comp_eq_score = comp_eq(ot, inferred_ot)
-                        inferred_ot_str = self.ot_to_text(inferred_ot, db_name)
-                        if inferred_ot_str is None:
-                            beam['beam_ot3_fail'] = True
-                        else:
-                            beam['beam_ot3_fail'] = False
-
-                        beam['is_correct_ot'] = bool(comp_eq_score)
-                        beam['inferred_question'] = inferred_ot_str
-                fout.write(json.dumps(jdict) + '\n')
+                    beam['beam_ot3_fail'] = False
+
+                beam['is_correct_ot'] = bool(comp_eq_score)
+                beam['inferred_question'] = inferred_ot_str
+        return dumps_record(jdict)
 
+    def back_translate(self, in_fname, out_fname, dataset):
+        lines = iter_lines(in_fname)
+        if self.workers > 1:
+            # the input is handed to the pool in bounded windows, so the whole file is never held in memory.
+            # imap keeps the order of the input, so the output is identical to the serial path
+            window = self.workers * self.chunksize * 16
+            pool = self._get_pool()
+            out_lines = (
+                out_line
+                for batch in iter_batches(((line, dataset) for line in lines), window)
+                for out_line in pool.imap(_translate_line, batch, chunksize=self.chunksize)
+            )
+        else:
+            out_lines = (self.translate_line(line, dataset) for line in lines)
+
+        with JsonlWriter(out_fname) as writer:
+            for out_line in tqdm(out_lines, total=count_records(in_fname), desc=f'Backtranslation for {in_fname}'):
+                if out_line is not None:
+                    writer.write_line(out_line)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--dataset', dest='dataset', type=str, required=True)
     parser.add_argument('-s', '--system', dest='system', type=str, required=True)
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=1)
     args = parser.parse_args()
     dataset = args.dataset
     system = args.system
@@ -110,6 +178,8 @@ if __name__ == '__main__':
     in_fname = 'outs/moviedata/grammar_net/6/raw_output_0.txt'
     out_fname = 'outs/moviedata/grammar_net/6/back-translated_output.txt'
 
-    bt = BackTranslation().back_translate(in_fname, out_fname, dataset)
-
-
+    bt = BackTranslation(workers=args.workers)
+    try:
+        bt.back_translate(in_fname, out_fname, dataset)
+    finally:
+        bt.close()
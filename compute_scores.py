@@ -1,7 +1,10 @@
 import json
 import argparse
 
+from typing import Dict, List, Tuple
+
 from utils.conversion_cache import ConvertorCache
+from utils.jsonl import read_jsonl
 
 from semql.core.ast import *
 
@@ -40,17 +43,15 @@ def compute_complexity(tree: Operation):
 class SpiderLoader:
 
     def __init__(self, eval_file, rank_score=False, use_comp_eq=True, normalize_len=False):
-        with open(eval_file, 'r') as fin:
-            samples = [json.loads(line) for line in fin]
-
-        self.samples = samples
+        # the samples are streamed from the file on every iteration instead of being held in memory
+        self.eval_file = eval_file
         self.cache = ConvertorCache()
         self.rank_score = rank_score
         self.comp_eq = use_comp_eq
         self.normalize_len = normalize_len
 
     def __iter__(self):
-        for sample in self.samples:
+        for sample in read_jsonl(self.eval_file):
             if sample.get('gold_sql2ot_fail', False) \
                     or sample.get('gold_ot3_fail', False):
                 continue
@@ -103,16 +104,13 @@ class SpiderLoader:
 class OttaLoader:
 
     def __init__(self, eval_file, rank_score=False, use_comp_eq=True):
-        with open(eval_file, 'r') as fin:
-            samples = [json.loads(line) for line in fin]
-
-        self.samples = samples
+        self.eval_file = eval_file
         self.cache = ConvertorCache()
         self.rank_score = rank_score
         self.comp_eq = use_comp_eq
 
     def __iter__(self):
-        for sample in self.samples:
+        for sample in read_jsonl(self.eval_file):
             beams = sample['beams']
             out = []
             for ix, b in enumerate(beams):
@@ -132,6 +130,105 @@ class OttaLoader:
             yield out
 
 
+class BeamFeatures:
+    """
+    Columnar representation of the beam lists produced by the loaders. Every feature is stored as one flat array
+    over all beams, `offsets` holds the start of each sample's beams (CSR style), i.e. the beams of sample `i` are
+    `offsets[i]:offsets[i + 1]`.
+    """
+    FEATURES = ['conf', 'nubia', 'eq', 'log_len', 'rank_score']
+
+    def __init__(self, offsets: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.offsets = offsets
+        self.columns = columns
+
+    @staticmethod
+    def from_beam_lists(data_iter) -> 'BeamFeatures':
+        """
+        Builds the columns from an iterable of beam lists (e.g. a loader), consuming it one sample at a time.
+        """
+        if isinstance(data_iter, BeamFeatures):
+            return data_iter
+        values = {name: [] for name in BeamFeatures.FEATURES}
+        lengths = []
+        for beams in data_iter:
+            if len(beams) == 0:
+                raise ValueError('Samples without beams are not supported')
+            lengths.append(len(beams))
+            for name, vals in values.items():
+                vals.extend(b[name] for b in beams)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        columns = {name: np.asarray(vals, dtype=bool if name == 'eq' else np.float64)
+                   for name, vals in values.items()}
+        return BeamFeatures(offsets, columns)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.offsets[:-1]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def take(self, sample_ixs: np.ndarray) -> 'BeamFeatures':
+        """
+        Returns the store restricted to the given samples (in the given order).
+        """
+        sample_ixs = np.asarray(sample_ixs, dtype=np.int64)
+        lengths = self.lengths[sample_ixs]
+        offsets = np.zeros(len(sample_ixs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        beam_ixs = np.repeat(self.starts[sample_ixs] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return BeamFeatures(offsets, {name: col[beam_ixs] for name, col in self.columns.items()})
+
+    def segment_max(self, values: np.ndarray) -> np.ndarray:
+        """
+        Returns the maximum of each sample, NaN values are ignored (the maximum is NaN if all values are NaN).
+        """
+        return np.fmax.reduceat(values, self.starts)
+
+    def segment_argmax(self, values: np.ndarray) -> np.ndarray:
+        """
+        Returns the global index of the first maximal beam of each sample, like `max(beams, key=...)` does. Beams with
+        a NaN value are never picked, unless all beams of the sample have one, then the first beam is picked.
+        """
+        is_max = values == np.repeat(self.segment_max(values), self.lengths)
+        positions = np.where(is_max, np.arange(len(values)), len(values))
+        picks = np.minimum.reduceat(positions, self.starts)
+        return np.where(picks == len(values), self.starts, picks)
+
+    def count_correct(self, picks: np.ndarray) -> int:
+        return int(self.columns['eq'][picks].sum())
+
+
+def pick_top_1(features: BeamFeatures) -> np.ndarray:
+    return features.starts
+
+
+def pick_highest_conf(features: BeamFeatures) -> np.ndarray:
+    return features.segment_argmax(features['conf'])
+
+
+def pick_oracle(features: BeamFeatures) -> np.ndarray:
+    return features.segment_argmax(features['eq'])
+
+
+def pick_nubia(features: BeamFeatures) -> np.ndarray:
+    return features.segment_argmax(features['nubia'])
+
+
+def pick_naive_mixer(features: BeamFeatures) -> np.ndarray:
+    return features.segment_argmax(features['conf'] * features['nubia'])
+
+
 def select_top_1(beams):
     return beams[0]
 
@@ -162,17 +259,12 @@ def count_correct(entries, selection_fn):
 class SelectiveMixer:
     def __init__(self, train_data):
         # self.threshold = 0.90
-        highest_confs = [
-            select_highest_conf(beams=beam_list)
-            for beam_list in train_data
-        ]
-        all_confs = [
-            b['conf']
-            for b_lst in train_data
-            for b in b_lst
-        ]
-        percentile = np.percentile(all_confs, 90)
-        self.threshold = min(d['conf'] for d in highest_confs if d['eq'] and d['conf'] > percentile) - 0.01
+        train_data = BeamFeatures.from_beam_lists(train_data)
+        conf = train_data['conf']
+        highest_confs = pick_highest_conf(train_data)
+        percentile = np.percentile(conf, 90)
+        selected = highest_confs[train_data['eq'][highest_confs] & (conf[highest_confs] > percentile)]
+        self.threshold = min(conf[selected]) - 0.01
         self.threshold = max(percentile, self.threshold)
         # print(percentile, self.threshold)
 
@@ -182,6 +274,10 @@ class SelectiveMixer:
         else:
             return select_nubia(beam_list)
 
+    def select(self, features: BeamFeatures) -> np.ndarray:
+        is_confident = features.segment_max(features['conf']) > self.threshold
+        return np.where(is_confident, pick_highest_conf(features), pick_nubia(features))
+
 
 class OracleSelection:
 
@@ -194,41 +290,37 @@ class OracleSelection:
         else:
             return top_nubia
 
+    def select(self, features: BeamFeatures) -> np.ndarray:
+        top_conf = pick_highest_conf(features)
+        return np.where(features['eq'][top_conf], top_conf, pick_nubia(features))
+
 
 class ScoreRegressor:
 
     def __init__(self, train_data):
-        x_train = []
-        y_train = []
-        for beam_list in train_data:
-            for beam in beam_list:
-                features = [
-                    beam['conf'],
-                    beam['nubia'],
-                    # beam['conf'] * beam['nubia'],
-                    # beam['rank_score'],
-                    # beam['log_len'],
-                ]
-                label = beam['eq']
-
-                x_train.append(features)
-                y_train.append(label)
+        train_data = BeamFeatures.from_beam_lists(train_data)
+        x_train = self._features(train_data['conf'], train_data['nubia'])
+        y_train = train_data['eq']
 
         self.logreg = LogisticRegression(
             class_weight='balanced',
         ).fit(x_train, y_train)
 
+    @staticmethod
+    def _features(conf, nubia):
+        return np.stack([
+            conf,
+            nubia,
+            # conf * nubia,
+            # rank_score,
+            # log_len,
+        ], axis=1)
+
     def __call__(self, beam_list):
-        feats = []
-        for beam in beam_list:
-            features = [
-                beam['conf'],
-                beam['nubia'],
-                # beam['conf'] * beam['nubia'],
-                # beam['rank_score'],
-                # beam['log_len'],
-            ]
-            feats.append(features)
+        feats = self._features(
+            np.array([beam['conf'] for beam in beam_list]),
+            np.array([beam['nubia'] for beam in beam_list]),
+        )
 
         ps = self.logreg.predict_proba(feats)
 
@@ -236,13 +328,18 @@ class ScoreRegressor:
 
         return beam_list[out_ix]
 
+    def select(self, features: BeamFeatures) -> np.ndarray:
+        ps = self.logreg.predict_proba(self._features(features['conf'], features['nubia']))
+        return features.segment_argmax(ps[:, 1])
+
 
 class ScoreMixer:
 
     def __init__(self, train_data):
-        train_scores = [[b['conf']] for lst in train_data for b in lst]
-        train_nubia = [[b['nubia']] for lst in train_data for b in lst]
-        labels = [b['eq'] for lst in train_data for b in lst]
+        train_data = BeamFeatures.from_beam_lists(train_data)
+        train_scores = train_data['conf'][:, None]
+        train_nubia = train_data['nubia'][:, None]
+        labels = train_data['eq']
 
         self.score_calib = LogisticRegression(
             class_weight='balance'
@@ -252,66 +349,77 @@ class ScoreMixer:
             class_weight='balance'
         ).fit(train_nubia, labels)
 
-    def __call__(self, beam_list):
-        scores = [[b['conf']] for b in beam_list]
-        nubia = [[b['nubia']] for b in beam_list]
+    def _mixed(self, conf, nubia):
+        calib_scores = self.score_calib.predict_proba(conf[:, None])[:, 1]
+        calib_nubia = self.nubia_calib.predict_proba(nubia[:, None])[:, 1]
 
-        calib_scores = self.score_calib.predict_proba(scores)[:, 1]
-        calib_nubia = self.nubia_calib.predict_proba(nubia)[:, 1]
+        return calib_scores * calib_nubia
+        # return 1. - (1. - calib_scores)*(1. - calib_nubia)
 
-        mixed = calib_scores * calib_nubia
-        # mixed = 1. - (1. - calib_scores)*(1. - calib_nubia)
+    def __call__(self, beam_list):
+        mixed = self._mixed(
+            np.array([b['conf'] for b in beam_list]),
+            np.array([b['nubia'] for b in beam_list]),
+        )
 
         selected_ix = np.argmax(mixed)
 
         return beam_list[selected_ix]
 
+    def select(self, features: BeamFeatures) -> np.ndarray:
+        return features.segment_argmax(self._mixed(features['conf'], features['nubia']))
+
 
 def base_eval(data_iter):
-    data = list(data_iter)
+    data = BeamFeatures.from_beam_lists(data_iter)
     print("FULL")
-    print('correct top 1', count_correct(data, select_top_1))
-    print('correct confidence', count_correct(data, select_highest_conf))
-    print('correct nubia', count_correct(data, select_nubia))
-    print('correct oracle', count_correct(data, select_oracle))
-    print('correct naive mixer', count_correct(data, naive_mixer))
+    print('correct top 1', data.count_correct(pick_top_1(data)))
+    print('correct confidence', data.count_correct(pick_highest_conf(data)))
+    print('correct nubia', data.count_correct(pick_nubia(data)))
+    print('correct oracle', data.count_correct(pick_oracle(data)))
+    print('correct naive mixer', data.count_correct(pick_naive_mixer(data)))
     print('total', len(data))
 
 
-def cv_eval(data_iter, random_seed, n_samples=20, console=True):
-    data = list(data_iter)
+def cv_folds(data: BeamFeatures, random_seed, n_samples=20) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Returns the (test_ixs, train_ixs) index arrays of all folds. Note that a single fold is used for training.
+    """
     skf = StratifiedKFold(
         n_splits=len(data) // n_samples,
         random_state=random_seed,
         shuffle=True,
     )
-    cv_results = []
-    oracle = [select_oracle(beams)['eq'] for beams in data]
-    for test_ixs, train_ixs in skf.split(X=data, y=oracle):
-        local_train = [e for ix, e in enumerate(data) if ix in train_ixs]
-        local_test = [e for ix, e in enumerate(data) if ix in test_ixs]
-
-        local_mixer = ScoreMixer(local_train)
-        local_regressor = ScoreRegressor(local_train)
-        local_selective = SelectiveMixer(local_train)
-        upper_bound = OracleSelection()
-
-        res = {
-            'n_test': len(test_ixs),
-            'n_train': len(train_ixs),
-            'n_confidence': count_correct(local_test, select_top_1),
-            'n_nubia': count_correct(local_test, select_nubia),
-            'n_naive': count_correct(local_test, naive_mixer),
-            'n_calib': count_correct(local_test, local_mixer),
-            'n_clf': count_correct(local_test, local_regressor),
-            'n_ifelse': count_correct(local_test, local_selective),
-            'n_upper_bound': count_correct(local_test, upper_bound),
-            'n_oracle': count_correct(local_test, select_oracle),
-        }
-
-        cv_results.append(res)
-
-    accuracies = {
+    oracle = data['eq'][pick_oracle(data)]
+    return list(skf.split(X=np.zeros(len(data)), y=oracle))
+
+
+def eval_fold(data: BeamFeatures, test_ixs: np.ndarray, train_ixs: np.ndarray) -> Dict[str, int]:
+    # folds are gathered from the columns by their index arrays
+    local_train = data.take(train_ixs)
+    local_test = data.take(test_ixs)
+
+    local_mixer = ScoreMixer(local_train)
+    local_regressor = ScoreRegressor(local_train)
+    local_selective = SelectiveMixer(local_train)
+    upper_bound = OracleSelection()
+
+    return {
+        'n_test': len(test_ixs),
+        'n_train': len(train_ixs),
+        'n_confidence': local_test.count_correct(pick_top_1(local_test)),
+        'n_nubia': local_test.count_correct(pick_nubia(local_test)),
+        'n_naive': local_test.count_correct(pick_naive_mixer(local_test)),
+        'n_calib': local_test.count_correct(local_mixer.select(local_test)),
+        'n_clf': local_test.count_correct(local_regressor.select(local_test)),
+        'n_ifelse': local_test.count_correct(local_selective.select(local_test)),
+        'n_upper_bound': local_test.count_correct(upper_bound.select(local_test)),
+        'n_oracle': local_test.count_correct(pick_oracle(local_test)),
+    }
+
+
+def aggregate_accuracies(cv_results: List[Dict[str, int]]) -> Dict[str, List[float]]:
+    return {
         'confidence': [e['n_confidence'] / e['n_test'] for e in cv_results],
         'semantic': [e['n_nubia'] / e['n_test'] for e in cv_results],
         'equal': [e['n_naive'] / e['n_test'] for e in cv_results],
@@ -322,6 +430,15 @@ def cv_eval(data_iter, random_seed, n_samples=20, console=True):
         'oracle': [e['n_oracle'] / e['n_test'] for e in cv_results],
     }
 
+
+def cv_eval(data_iter, random_seed, n_samples=20, console=True):
+    data = BeamFeatures.from_beam_lists(data_iter)
+    cv_results = [
+        eval_fold(data, test_ixs, train_ixs)
+        for test_ixs, train_ixs in cv_folds(data, random_seed, n_samples)
+    ]
+    accuracies = aggregate_accuracies(cv_results)
+
     if console:
         print(f"name\tmean acc.\tstddev acc.")
         for name, vs in accuracies.items():
@@ -349,7 +466,7 @@ def main(eval_file, corpus, use_comp_eq, use_rank_score, n_samples, seed, len_no
         raise ValueError(
             f"unknown corpus '{corpus}', use one of ['spider', 'otta']")
 
-    data = list(loader)
+    data = BeamFeatures.from_beam_lists(loader)
 
     base_eval(data)
     print()
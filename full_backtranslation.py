@@ -1,7 +1,12 @@
+import argparse
 from pathlib import Path
 from back_translation import BackTranslation
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=1)
+    args = parser.parse_args()
+
     datasets = [
         ('spider', 'value_net'),
         ('spider', 'bridge'),
@@ -9,18 +14,23 @@ if __name__ == '__main__':
         ('chinook', 'grammar_net')
     ]
 
-    for dataset, system in datasets:
-        if dataset == 'spider':
-            in_fname = f'outs/{dataset}/{system}/raw_output.txt'
-            out_fname = f'outs/{dataset}/{system}/back-translated_output.txt'
-            bt = BackTranslation().back_translate(in_fname, out_fname, dataset)
-        else:
-            pattern = "outs/{}/grammar_net/{}/raw_output_{}.txt"
-            pattern_out = "outs/{}/grammar_net/{}/back-translated_output_{}.txt"
-            for split in range(1, 11):
-                for seed_ix in range(5):
-                    in_fname = Path(pattern.format(dataset, split, seed_ix))
-                    out_fname = Path(pattern_out.format(dataset, split, seed_ix))
-                    if not in_fname.exists():
-                        continue
-                    bt = BackTranslation().back_translate(in_fname, out_fname, dataset)
\ No newline at end of file
+    # a single instance is shared by all files, so the worker processes stay warm
+    bt = BackTranslation(workers=args.workers)
+    try:
+        for dataset, system in datasets:
+            if dataset == 'spider':
+                in_fname = f'outs/{dataset}/{system}/raw_output.txt'
+                out_fname = f'outs/{dataset}/{system}/back-translated_output.txt'
+                bt.back_translate(in_fname, out_fname, dataset)
+            else:
+                pattern = "outs/{}/grammar_net/{}/raw_output_{}.txt"
+                pattern_out = "outs/{}/grammar_net/{}/back-translated_output_{}.txt"
+                for split in range(1, 11):
+                    for seed_ix in range(5):
+                        in_fname = Path(pattern.format(dataset, split, seed_ix))
+                        out_fname = Path(pattern_out.format(dataset, split, seed_ix))
+                        if not in_fname.exists():
+                            continue
+                        bt.back_translate(in_fname, out_fname, dataset)
+    finally:
+        bt.close()
@@ -1,27 +1,171 @@
+import os
+import argparse
+from multiprocessing import Pool
 from pathlib import Path
 import numpy as np
-from compute_scores import OttaLoader, cv_eval, SpiderLoader
+from compute_scores import OttaLoader, SpiderLoader, BeamFeatures, cv_folds, eval_fold, aggregate_accuracies
+from utils.jsonl import read_jsonl, loads_record, JsonlWriter
+
+RANDOM_SEED = 0xdeadbeef
+N_SAMPLES = 20
+
+DATASETS = [
+    ('spider', 'value_net'),
+    ('spider', 'bridge'),
+    ('moviedata', 'grammar_net'),
+    ('chinook', 'grammar_net')
+]
+
+
+def sweep_files(dataset, system):
+    """
+    Yields (key, path) for the evaluation files of a dataset in a fixed order, where key is the tuple
+    (dataset, system, split, seed_ix). Split and seed_ix are None for spider.
+    """
+    if dataset == 'spider':
+        yield (dataset, system, None, None), Path(f'outs/{dataset}/{system}/sem_sim_output.txt')
+    else:
+        pattern = "outs/{}/grammar_net/{}/sem_sim_output_{}.txt"
+        for split in range(1, 11):
+            for seed_ix in range(5):
+                p = Path(pattern.format(dataset, split, seed_ix))
+                if not p.exists():
+                    continue
+                yield (dataset, system, split, seed_ix), p
+
+
+def load_features(key, path) -> BeamFeatures:
+    dataset, system, _, _ = key
+    if dataset == 'spider':
+        norm_len = system == 'value_net'
+        loader = SpiderLoader(str(path), rank_score=False, use_comp_eq=True, normalize_len=norm_len)
+    else:
+        loader = OttaLoader(str(path), rank_score=False, use_comp_eq=True)
+    return BeamFeatures.from_beam_lists(loader)
+
+
+def _load_job(args):
+    key, path = args
+    data = load_features(key, path)
+    return key, data, cv_folds(data, random_seed=RANDOM_SEED, n_samples=N_SAMPLES)
+
+
+def _fold_job(args):
+    key, fold_ix, data, test_ixs, train_ixs = args
+    return key, fold_ix, eval_fold(data, test_ixs, train_ixs)
+
+
+def _file_version(path) -> int:
+    return os.stat(path).st_mtime_ns
+
+
+def _drop_truncated_line(results_fname):
+    """
+    A sweep that is killed while writing leaves a truncated last line. It is removed from the file, so that the file
+    can be read and new results are appended after the last complete line.
+    """
+    with open(results_fname, 'rb+') as fout:
+        data = fout.read()
+        if not data or data.endswith(b'\n'):
+            return
+        last_line_start = data.rfind(b'\n') + 1
+        try:
+            loads_record(data[last_line_start:].decode('utf-8'))
+        except ValueError:
+            fout.truncate(last_line_start)
+        else:
+            # only the newline is missing
+            fout.write(b'\n')
+
+
+def load_partial_results(results_fname, files):
+    """
+    Reads the fold results of an earlier (possibly interrupted) sweep. Results are only reused if they were computed
+    with the same seed and number of samples from an unchanged evaluation file.
+    :return: Dict mapping each file key to a dict {fold_ix: result} and the number of folds of each completed key
+    """
+    results = {key: {} for key, _ in files}
+    n_folds = {}
+    if results_fname is None or not os.path.exists(results_fname):
+        return results, n_folds
+
+    _drop_truncated_line(results_fname)
+    versions = {key: _file_version(path) for key, path in files}
+    for record in read_jsonl(results_fname):
+        key = tuple(record['key'])
+        if key not in versions or record['version'] != versions[key] \
+                or record['random_seed'] != RANDOM_SEED or record['n_samples'] != N_SAMPLES:
+            continue
+        results[key][record['fold']] = record['res']
+        n_folds[key] = record['n_folds']
+    return results, n_folds
+
+
+def run_sweep(jobs=1, results_fname=None):
+    """
+    Runs the cross-validation of all evaluation files. Loading a file and evaluating a fold are separate jobs,
+    which are distributed over `jobs` processes. Finished folds are appended to `results_fname`, so an interrupted
+    sweep resumes from there.
+    :return: Dict mapping each file key to the list of fold results, ordered by fold
+    """
+    files = [file for dataset, system in DATASETS for file in sweep_files(dataset, system)]
+    results, n_folds = load_partial_results(results_fname, files)
+    pending_files = [(key, path) for key, path in files if len(results[key]) == 0 or len(results[key]) < n_folds[key]]
+    versions = {key: _file_version(path) for key, path in pending_files}
+
+    pool = Pool(jobs) if jobs > 1 else None
+    map_fn = pool.imap_unordered if pool is not None else map
+    writer = JsonlWriter(results_fname, buffer_size=1, append=True) if results_fname is not None else None
+    try:
+        fold_jobs = []
+        for key, data, folds in map_fn(_load_job, pending_files):
+            n_folds[key] = len(folds)
+            fold_jobs.extend(
+                (key, fold_ix, data, test_ixs, train_ixs)
+                for fold_ix, (test_ixs, train_ixs) in enumerate(folds)
+                if fold_ix not in results[key]
+            )
+
+        for key, fold_ix, res in map_fn(_fold_job, fold_jobs):
+            results[key][fold_ix] = res
+            if writer is not None:
+                writer.write({
+                    'key': key, 'fold': fold_ix, 'n_folds': n_folds[key], 'version': versions[key],
+                    'random_seed': RANDOM_SEED, 'n_samples': N_SAMPLES, 'res': res,
+                })
+    finally:
+        if writer is not None:
+            writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # the results are ordered by fold, so the aggregation does not depend on the order in which jobs finished
+    return {key: [fold_results[fold_ix] for fold_ix in sorted(fold_results)] for key, fold_results in results.items()}
+
 
 if __name__ == '__main__':
-    datasets = [
-        ('spider', 'value_net'),
-        ('spider', 'bridge'),
-        ('moviedata', 'grammar_net'),
-        ('chinook', 'grammar_net')
-    ]
-
-    for dataset, system in datasets:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1)
+    parser.add_argument('--results', dest='results', type=str, default='outs/cv_sweep_results.jsonl',
+                        help='file for the fold results, an interrupted sweep is resumed from it')
+    parser.add_argument('--no_resume', dest='no_resume', action='store_true')
+    args = parser.parse_args()
+
+    if args.no_resume and os.path.exists(args.results):
+        os.remove(args.results)
+
+    sweep_results = run_sweep(jobs=args.jobs, results_fname=args.results)
+
+    for dataset, system in DATASETS:
         if dataset == 'spider':
-            in_fname = f'outs/{dataset}/{system}/sem_sim_output.txt'
-            norm_len = system == 'value_net'
-            data = list(SpiderLoader(str(in_fname), rank_score=False, use_comp_eq=True, normalize_len=norm_len))
-            accs = cv_eval(data, random_seed=0xdeadbeef, n_samples=20, console=False)
+            key, _ = next(sweep_files(dataset, system))
+            accs = aggregate_accuracies(sweep_results[key])
             print(f"{dataset}-{system}")
             for name, vals in accs.items():
                 print(name, '\t', f"{np.mean(vals):.4f}")
             print()
         else:
-            pattern = "outs/{}/grammar_net/{}/sem_sim_output_{}.txt"
             accuracies = {
                 'confidence': [],
                 'semantic': [],
@@ -32,15 +176,10 @@ if __name__ == '__main__':
                 'oracle-sem': [],
                 'oracle': [],
             }
-            for split in range(1, 11):
-                for seed_ix in range(5):
-                    p = Path(pattern.format(dataset, split, seed_ix))
-                    if not p.exists():
-                        continue
-                    data = list(OttaLoader(str(p), rank_score=False, use_comp_eq=True))
-                    accs = cv_eval(data, random_seed=0xdeadbeef, n_samples=20, console=False)
-                    for name in accuracies.keys():
-                        accuracies[name].append(np.mean(accs[name]))
+            for key, _ in sweep_files(dataset, system):
+                accs = aggregate_accuracies(sweep_results[key])
+                for name in accuracies.keys():
+                    accuracies[name].append(np.mean(accs[name]))
             print(f"{dataset}-{system}")
             for name, vals in accuracies.items():
                 print(name, '\t', f"{np.mean(vals):.4f}")
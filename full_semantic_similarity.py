@@ -1,7 +1,15 @@
+import argparse
 from pathlib import Path
-from semantic_similarity import compute_semantic_similarity
+from semantic_similarity import compute_semantic_similarity, get_scorer, SCORERS, NubiaScorer, DEFAULT_MEMO_PATH
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scorer', dest='scorer', type=str, default=NubiaScorer.name, choices=list(SCORERS.keys()))
+    parser.add_argument('--memo', dest='memo', type=str, default=DEFAULT_MEMO_PATH)
+    parser.add_argument('--no_memo', dest='no_memo', action='store_true')
+    parser.add_argument('-b', '--batch_size', dest='batch_size', type=int, default=32)
+    args = parser.parse_args()
+
     datasets = [
         ('spider', 'value_net'),
         ('spider', 'bridge'),
@@ -9,11 +17,14 @@ if __name__ == '__main__':
         ('chinook', 'grammar_net')
     ]
 
+    # the scorer (and its models) is loaded once and shared by all files
+    scorer = get_scorer(args.scorer, memo_path=None if args.no_memo else args.memo)
+
     for dataset, system in datasets:
         if dataset == 'spider':
             in_fname = f'outs/{dataset}/{system}/back-translated_output.txt'
             out_fname = f'outs/{dataset}/{system}/sem_sim_output.txt'
-            bt = compute_semantic_similarity(in_fname, out_fname)
+            compute_semantic_similarity(in_fname, out_fname, scorer=scorer, batch_size=args.batch_size)
         else:
             pattern = "outs/{}/grammar_net/{}/back-translated_output_{}.txt"
             pattern_out = "outs/{}/grammar_net/{}/sem_sim_output_{}.txt"
@@ -23,4 +34,4 @@ if __name__ == '__main__':
                     out_fname = Path(pattern_out.format(dataset, split, seed_ix))
                     if not in_fname.exists():
                         continue
-                    bt = compute_semantic_similarity(in_fname, out_fname)
\ No newline at end of file
+                    compute_semantic_similarity(in_fname, out_fname, scorer=scorer, batch_size=args.batch_size)
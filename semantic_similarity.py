@@ -1,38 +1,190 @@
-import argparse, json
-from nubia_score.nubia import Nubia
+import os
+import re
+import argparse
+import sqlite3
+
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import List, Tuple, Dict
+
 from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
 
 from tqdm import tqdm
+from utils.jsonl import read_jsonl, count_records, iter_batches, JsonlWriter
+
+DEFAULT_MEMO_PATH = os.path.join('.cache', 'semsim.sqlite')
+
+
+class Scorer(ABC):
+    """
+    Computes semantic similarity scores between reference and hypothesis sentences.
+    """
+    name: str = None
+
+    @abstractmethod
+    def score_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        :param pairs: List of (ref, hyp) tuples
+        :return: One score per pair
+        """
+        pass
+
+
+class NubiaScorer(Scorer):
+    name = 'nubia'
+
+    def __init__(self):
+        # imported here, so that the other scorers can be used without the Nubia models
+        from nubia_score.nubia import Nubia
+        self.nubia = Nubia()
+
+    def score_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        # Nubia only exposes scoring of single pairs
+        return [self.nubia.score(ref=ref, hyp=hyp) for ref, hyp in pairs]
+
+
+class TokenF1Scorer(Scorer):
+    """
+    Lightweight scorer based on the F1 of the token overlap. It needs no models and serves to exercise and
+    benchmark the pipeline.
+    """
+    name = 'token_f1'
+    TOKEN_RE = re.compile(r'\w+')
+
+    def _tokens(self, sentence: str) -> Counter:
+        return Counter(self.TOKEN_RE.findall(sentence.lower()))
+
+    def score_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        scores = []
+        for ref, hyp in pairs:
+            ref_tokens = self._tokens(ref)
+            hyp_tokens = self._tokens(hyp)
+            n_common = sum((ref_tokens & hyp_tokens).values())
+            if n_common == 0:
+                scores.append(0.)
+                continue
+            precision = n_common / sum(hyp_tokens.values())
+            recall = n_common / sum(ref_tokens.values())
+            scores.append(2 * precision * recall / (precision + recall))
+        return scores
+
+
+SCORERS = {
+    NubiaScorer.name: NubiaScorer,
+    TokenF1Scorer.name: TokenF1Scorer,
+}
+
+
+class MemoizedScorer(Scorer):
+    """
+    Wraps a scorer with an on-disk memo (SQLite) keyed by (scorer name, ref, hyp). Only pairs that are not in the
+    memo are passed on to the wrapped scorer.
+    """
+
+    def __init__(self, scorer: Scorer, memo_path: str = DEFAULT_MEMO_PATH):
+        self.scorer = scorer
+        self.name = scorer.name
+        memo_dir = os.path.dirname(memo_path)
+        if memo_dir:
+            os.makedirs(memo_dir, exist_ok=True)
+        self.conn = sqlite3.connect(memo_path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS scores '
+                          '(scorer TEXT, ref TEXT, hyp TEXT, score REAL, PRIMARY KEY (scorer, ref, hyp))')
+
+    def _lookup(self, pair: Tuple[str, str]):
+        """
+        Returns the memoized score or None if the pair is not in the memo. SQLite stores NaN as NULL, so a NULL score
+        is a memoized NaN.
+        """
+        row = self.conn.execute('SELECT score FROM scores WHERE scorer = ? AND ref = ? AND hyp = ?',
+                                (self.name, *pair)).fetchone()
+        if row is None:
+            return None
+        return float('nan') if row[0] is None else row[0]
+
+    def score_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        scores = {pair: self._lookup(pair) for pair in pairs}
+        missing = [pair for pair, score in scores.items() if score is None]
+        if len(missing) > 0:
+            new_scores = self.scorer.score_batch(missing)
+            scores.update(zip(missing, new_scores))
+            self.conn.executemany('INSERT OR REPLACE INTO scores (scorer, ref, hyp, score) VALUES (?, ?, ?, ?)',
+                                  [(self.name, ref, hyp, score) for (ref, hyp), score in zip(missing, new_scores)])
+            self.conn.commit()
+        return [scores[pair] for pair in pairs]
+
+    def close(self):
+        self.conn.close()
+
+
+def get_scorer(name: str = NubiaScorer.name, memo_path: str = DEFAULT_MEMO_PATH) -> Scorer:
+    """
+    :param name: One of the keys of `SCORERS`
+    :param memo_path: Path of the on-disk memo, None disables the memo.
+    """
+    if name not in SCORERS:
+        raise ValueError(f"unknown scorer '{name}', use one of {list(SCORERS.keys())}")
+    scorer = SCORERS[name]()
+    if memo_path is not None:
+        scorer = MemoizedScorer(scorer, memo_path)
+    return scorer
+
+
+def _score_samples(samples: List[Dict], scorer: Scorer):
+    # collect the distinct (ref, hyp) pairs of all samples in the batch, many beams share their back-translation
+    pairs = {}
+    for jdict in samples:
+        orig_question = jdict['beams'][0]['orig_question']
+        for beam in jdict['beams']:
+            inferred_ot_str = beam['inferred_question']
+            if not (inferred_ot_str is None or inferred_ot_str == ''):
+                pairs[(orig_question, inferred_ot_str)] = None
+
+    unique_pairs = list(pairs.keys())
+    pair_scores = dict(zip(unique_pairs, scorer.score_batch(unique_pairs)))
 
-nubia = Nubia()
+    for jdict in samples:
+        orig_question = jdict['beams'][0]['orig_question']
+        for beam in jdict['beams']:
+            inferred_ot_str = beam['inferred_question']
+            if inferred_ot_str is None or inferred_ot_str == '':
+                nubia_score, bleu_score = 0, 0
+            else:
+                nubia_score = pair_scores[(orig_question, inferred_ot_str)]
+                bleu_score = sentence_bleu([orig_question], inferred_ot_str, smoothing_function=SmoothingFunction().method3)
+            # the field keeps its name for all scorers, since the re-ranking reads it from there
+            beam['beam_nubia_score'] = nubia_score
+            beam['beam_bleu_score'] = bleu_score
 
-def compute_semantic_similarity(in_fname, out_fname):
-    with open(in_fname, 'rt', encoding='utf-8') as fin, open(out_fname, 'wt', encoding='utf-8') as fout:
-        for line in tqdm(fin.readlines(), desc=f'SemSim for {in_fname}'):
-            jdict = json.loads(line.replace('\n', ''))
-            beams = jdict['beams']
-            orig_question = jdict['beams'][0]['orig_question']
 
-            for beam in beams:
-                inferred_ot_str = beam['inferred_question']
-                if inferred_ot_str is None or inferred_ot_str == '':
-                    nubia_score, bleu_score = 0, 0
-                else:
-                    nubia_score = nubia.score(ref=orig_question, hyp=inferred_ot_str)
-                    bleu_score = sentence_bleu([orig_question], inferred_ot_str, smoothing_function=SmoothingFunction().method3)
-                beam['beam_nubia_score'] = nubia_score
-                beam['beam_bleu_score'] = bleu_score
-            fout.write(json.dumps(jdict) + '\n')
+def compute_semantic_similarity(in_fname, out_fname, scorer: Scorer = None, batch_size: int = 32):
+    """
+    :param scorer: Scorer used for the semantic similarity, defaults to the memoized Nubia scorer.
+    :param batch_size: Number of samples whose distinct pairs are scored together.
+    """
+    if scorer is None:
+        scorer = get_scorer()
+    with JsonlWriter(out_fname) as writer, tqdm(total=count_records(in_fname), desc=f'SemSim for {in_fname}') as pbar:
+        for samples in iter_batches(read_jsonl(in_fname), batch_size):
+            _score_samples(samples, scorer)
+            for jdict in samples:
+                writer.write(jdict)
+            pbar.update(len(samples))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--dataset', dest='dataset', type=str, required=True)
     parser.add_argument('-s', '--system', dest='system', type=str, required=True)
+    parser.add_argument('--scorer', dest='scorer', type=str, default=NubiaScorer.name, choices=list(SCORERS.keys()))
+    parser.add_argument('--memo', dest='memo', type=str, default=DEFAULT_MEMO_PATH)
+    parser.add_argument('--no_memo', dest='no_memo', action='store_true')
+    parser.add_argument('-b', '--batch_size', dest='batch_size', type=int, default=32)
     args = parser.parse_args()
     dataset = args.dataset
     system = args.system
 
     in_fname = f'outs/{dataset}/{system}/back-translated_output.txt'
     out_fname = f'outs/{dataset}/{system}/sem_sim_output.txt'
-    compute_semantic_similarity(in_fname, out_fname)
+    scorer = get_scorer(args.scorer, memo_path=None if args.no_memo else args.memo)
+    compute_semantic_similarity(in_fname, out_fname, scorer=scorer, batch_size=args.batch_size)
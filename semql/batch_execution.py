@@ -0,0 +1,135 @@
+from typing import Dict, List, Tuple
+
+from semql.core.ast import Operation
+from semql.data_sources import BaseDataSource
+from semql.execution import OpResult, SQLExecutor
+
+
+class BatchExecutor:
+    """
+    Executes all trees of one sample (e.g. the beams of one question) together. The trees are merged into a DAG by
+    interning every subtree by its structure, i.e. its operation, its arguments (compared by type and value) and
+    its children. Every distinct subtree is evaluated only once and all trees containing it share the result, so
+    beams that only differ in a filter or a projection share their `GetData`/`Merge` spine.
+
+    `type` selects the backend: 'semql' and 'columnar' share every subtree, 'sql' executes every distinct tree once
+    with the `SQLExecutor` (shared subtrees are picked up by the `ResultCache`, if one is set).
+    """
+
+    def __init__(self, root_nodes: List[Operation], type: str = 'semql'):
+        type = type.lower()
+        if type not in ('semql', 'columnar', 'sql'):
+            raise ValueError('Wrong type of executor.')
+        self.root_nodes = root_nodes
+        self.type = type
+        self._ids: Dict[Tuple, int] = {}
+        self._results: Dict[int, object] = {}
+        self._columnar = None
+
+    def subtree_id(self, node: Operation, children_ids: List[int]) -> int:
+        """
+        Returns the id of the distinct subtree rooted at `node`, structurally equal subtrees get the same id.
+        """
+        key = (node.node_key(), tuple(children_ids))
+        subtree_id = self._ids.get(key)
+        if subtree_id is None:
+            subtree_id = self._ids[key] = len(self._ids)
+        return subtree_id
+
+    def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0,
+            return_exceptions: bool = False) -> List[OpResult]:
+        """
+        Returns the results of all trees in the order of `root_nodes`. If `return_exceptions` is set, a tree that
+        fails yields its exception instead of raising it.
+        """
+        if len(self.root_nodes) == 0:
+            return []
+
+        data_source_name = self.root_nodes[0]._get_data_source_name()
+        with BaseDataSource.get(data_source_name).session():
+            if self.type == 'sql':
+                return self._run_sql(save_intermediate_result_in_nodes, preview_limit, return_exceptions)
+
+            if self.type == 'columnar':
+                from semql.columnar_execution import ColumnarExecutor  # TODO: break circular dependency on imports
+                self._columnar = ColumnarExecutor(self.root_nodes[0])
+
+            node_ids = {}
+            results = []
+            for root_node in self.root_nodes:
+                root_id = self._dfs_run(root_node, node_ids)
+                result = self._results[root_id]
+                if isinstance(result, Exception) and not return_exceptions:
+                    raise result
+                results.append(result if isinstance(result, Exception) else self._to_op_result(result))
+
+        for root_node in self.root_nodes:
+            self._set_node_results(root_node, node_ids, save_intermediate_result_in_nodes, preview_limit)
+        return results
+
+    def _dfs_run(self, node: Operation, node_ids: Dict[int, int]) -> int:
+        children_ids = [self._dfs_run(child, node_ids) for child in node.children]
+        subtree_id = self.subtree_id(node, children_ids)
+        node_ids[id(node)] = subtree_id
+
+        if subtree_id not in self._results:
+            children_results = [self._results[child_id] for child_id in children_ids]
+            failed_children = [res for res in children_results if isinstance(res, Exception)]
+            if failed_children:
+                self._results[subtree_id] = failed_children[0]
+            else:
+                try:
+                    self._results[subtree_id] = self._run_node(node, children_results)
+                except Exception as e:
+                    self._results[subtree_id] = e
+        return subtree_id
+
+    def _run_node(self, node: Operation, children_results: List):
+        if self.type == 'columnar':
+            return self._columnar.run_node(node, children_results)
+
+        for child, child_result in zip(node.children, children_results):
+            child.op_result = child_result
+        node.run()
+        return node.get_result()
+
+    def _to_op_result(self, result, preview_limit: int = 0) -> OpResult:
+        if self.type == 'columnar':
+            return result.to_op_result(preview_limit)
+        if preview_limit > 0:
+            return result.head(preview_limit)
+        return result
+
+    def _set_node_results(self, root_node: Operation, node_ids: Dict[int, int],
+                          save_intermediate_result_in_nodes: bool, preview_limit: int):
+        stack = [root_node]
+        while stack:
+            cur_node = stack.pop()
+            result = self._results[node_ids[id(cur_node)]]
+            if save_intermediate_result_in_nodes and not isinstance(result, Exception):
+                cur_node.op_result = self._to_op_result(result, preview_limit)
+            else:
+                cur_node.op_result = None
+            stack.extend(cur_node.children)
+
+    def _run_sql(self, save_intermediate_result_in_nodes: bool, preview_limit: int,
+                 return_exceptions: bool) -> List[OpResult]:
+        results = []
+        for root_node in self.root_nodes:
+            root_id = self._subtree_id_of_tree(root_node)
+            # intermediate results are saved in the nodes, so every tree has to be executed in that case
+            if root_id not in self._results or save_intermediate_result_in_nodes:
+                try:
+                    self._results[root_id] = SQLExecutor(root_node).run(save_intermediate_result_in_nodes,
+                                                                        preview_limit)
+                except Exception as e:
+                    self._results[root_id] = e
+
+            result = self._results[root_id]
+            if isinstance(result, Exception) and not return_exceptions:
+                raise result
+            results.append(result)
+        return results
+
+    def _subtree_id_of_tree(self, node: Operation) -> int:
+        return self.subtree_id(node, [self._subtree_id_of_tree(child) for child in node.children])
@@ -0,0 +1,479 @@
+import numbers
+import operator
+
+import numpy as np
+
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from semql.core.ast import *
+from semql.execution import Executor, OpResult
+
+
+def _column_array(values: List) -> np.ndarray:
+    """
+    Converts the values of one column into an array. Columns that only contain ints (or only floats) get a numeric
+    dtype, all other columns (including the ones containing `None`) are stored as object arrays, so that comparisons
+    behave exactly like on the python values.
+    """
+    value_types = set(map(type, values))
+    if value_types == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    elif value_types == {float}:
+        return np.array(values, dtype=np.float64)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _is_numeric_array(array: np.ndarray) -> bool:
+    return array.dtype != object
+
+
+def _not_null(array: np.ndarray) -> np.ndarray:
+    if _is_numeric_array(array):
+        return np.ones(len(array), dtype=bool)
+    return np.fromiter((val is not None for val in array), dtype=bool, count=len(array))
+
+
+def _concat(arrays: List[np.ndarray]) -> np.ndarray:
+    if len({array.dtype for array in arrays}) > 1:
+        arrays = [array.astype(object) for array in arrays]
+    return np.concatenate(arrays)
+
+
+def _group_codes(array: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Assigns a group code to every value. Groups are numbered in the order of their first appearance, like the keys
+    of a `dict` filled row by row. Returns the codes and the index of the first row of every group.
+    """
+    if _is_numeric_array(array):
+        _, first_index, inverse = np.unique(array, return_index=True, return_inverse=True)
+        order = np.argsort(first_index, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank[inverse.reshape(-1)], first_index[order]
+
+    code_for_value = {}
+    first_index = []
+    codes = np.empty(len(array), dtype=np.int64)
+    for idx, val in enumerate(array.tolist()):
+        code = code_for_value.get(val)
+        if code is None:
+            code = code_for_value[val] = len(first_index)
+            first_index.append(idx)
+        codes[idx] = code
+    return codes, np.array(first_index, dtype=np.int64)
+
+
+def _sum(values: np.ndarray):
+    """
+    Sums a column in row order. Floats are added sequentially (`np.sum` sums pairwise), so that the result is
+    identical to the row based operations.
+    """
+    if values.dtype.kind == 'i':
+        return values.sum().item()
+    return sum(values.tolist())
+
+
+def _isin(array: np.ndarray, other: np.ndarray) -> np.ndarray:
+    if _is_numeric_array(array) and _is_numeric_array(other):
+        return np.isin(array, other)
+    other_values = set(other.tolist())
+    return np.fromiter((val in other_values for val in array.tolist()), dtype=bool, count=len(array))
+
+
+def _checked_numbers(array: np.ndarray, attribute_name: str) -> np.ndarray:
+    """
+    Returns the non-null values of a column that is used in an arithmetic aggregation. Raises a `ValueError` if one
+    of them is not numeric, like the row-based operations do.
+    """
+    if _is_numeric_array(array):
+        return array
+    values = array[_not_null(array)]
+    if not all(isinstance(val, numbers.Number) for val in values):
+        raise ValueError(f'Attribute {attribute_name} is not numeric')
+    return values
+
+
+class ColumnarResult(object):
+    """
+    Intermediate result of the `ColumnarExecutor`: one array per column, all of the same length.
+
+    `header` holds the columns that the equivalent `OpResult` reports when it is empty; a non-empty `OpResult` takes
+    its columns from the row keys, i.e. from `columns`.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], length: int, header: List[str] = None):
+        self.columns = columns
+        self.length = length
+        self.header = list(columns) if header is None else header
+
+    @staticmethod
+    def from_op_result(op_result: OpResult) -> 'ColumnarResult':
+        rows = op_result.get_rows()
+        names = op_result.get_columns() if len(rows) > 0 else []
+        columns = {name: _column_array(list(values)) for name, values in zip(names, zip(*rows))}
+        return ColumnarResult(columns, len(rows), op_result.get_columns())
+
+    def get_columns(self) -> List[str]:
+        return list(self.columns) if self.length > 0 else self.header
+
+    def column(self, name: str, exception: type = ValueError, message: str = None) -> np.ndarray:
+        if name not in self.columns:
+            raise exception(message if message is not None else f'Missing attribute {name}')
+        return self.columns[name]
+
+    def take(self, indices: np.ndarray, header: List[str] = None) -> 'ColumnarResult':
+        return ColumnarResult({name: array[indices] for name, array in self.columns.items()}, len(indices),
+                              self.get_columns() if header is None else header)
+
+    def to_op_result(self, limit: int = 0) -> OpResult:
+        length = self.length if limit <= 0 else min(limit, self.length)
+        if length == 0:
+            return OpResult([], self.header)
+        names = list(self.columns)
+        values = [self.columns[name][:length].tolist() for name in names]
+        return OpResult.from_rows(list(zip(*values)), names)
+
+
+class ColumnarExecutor(Executor):
+    """
+    Executes an operation tree in memory like the `SemQLExecutor`, but keeps the intermediate results as column
+    arrays: filters become boolean masks, merges a hash join on index pairs and distinct/aggregations run over whole
+    columns. Rows are only materialized for the final `OpResult` (and for the nodes, if the intermediate results
+    are saved). Operations without a columnar implementation fall back to their `run()` method.
+    """
+
+    OPERATOR_MAP = {
+        '=': operator.eq,
+        '==': operator.eq,
+        '<': operator.lt,
+        '>': operator.gt,
+        '>=': operator.ge,
+        '<=': operator.le,
+        '!=': operator.ne
+    }
+
+    def __init__(self, root_node: 'Operation'):
+        super().__init__(root_node)
+        self._runners: Dict[type, Callable] = {
+            GetData: self._run_get_data,
+            Filter: self._run_filter,
+            Merge: self._run_merge,
+            Distinct: self._run_distinct,
+            ExtractValues: self._run_extract_values,
+            Sum: self._run_sum,
+            Average: self._run_average,
+            MaxAggregation: self._run_max_aggregation,
+            MinAggregation: self._run_min_aggregation,
+            Count: self._run_count,
+            Max: self._run_max,
+            Min: self._run_min,
+            Union: self._run_union,
+            Intersection: self._run_intersection,
+            Difference: self._run_difference,
+            AverageBy: self._run_average_by,
+            SumBy: self._run_sum_by,
+            CountBy: self._run_count_by,
+            Done: self._run_done,
+            IsEmpty: self._run_is_empty,
+        }
+
+    def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0) -> 'OpResult':
+        result_for_node = {}
+        with self._session():
+            root_result = self._dfs_run(self.root_node, result_for_node)
+
+        stack = [self.root_node]
+        while stack:
+            cur_node = stack.pop()
+            if save_intermediate_result_in_nodes:
+                cur_node.op_result = result_for_node[id(cur_node)].to_op_result(preview_limit)
+            else:
+                cur_node.op_result = None
+            stack.extend(cur_node.children)
+
+        return root_result.to_op_result()
+
+    def _dfs_run(self, node: 'Operation', result_for_node: Dict[int, ColumnarResult]) -> ColumnarResult:
+        children_results = [self._dfs_run(child, result_for_node) for child in node.children]
+        result = self.run_node(node, children_results)
+        result_for_node[id(node)] = result
+        return result
+
+    def run_node(self, node: 'Operation', children_results: List[ColumnarResult]) -> ColumnarResult:
+        """
+        Executes a single node on the results of its children.
+        """
+        runner = self._runners.get(type(node))
+        if runner is not None:
+            return runner(node, *children_results)
+
+        for child, child_result in zip(node.children, children_results):
+            child.op_result = child_result.to_op_result()
+        node.run()
+        return ColumnarResult.from_op_result(node.get_result())
+
+    def _run_get_data(self, node: GetData) -> ColumnarResult:
+        node._set_datasource(node.data_source)
+        table_index = get_table_index(node.table_name, node.data_source)
+        column_values, columns = node.data_src.get_columns_and_project(node.table_name, list(table_index.attributes))
+        length = len(column_values[0]) if column_values else 0
+        return ColumnarResult({name: _column_array(values) for name, values in zip(columns, column_values)},
+                              length, columns)
+
+    def _run_filter(self, node: Filter, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return child.take(np.arange(0), child.get_columns())
+        array = child.column(node.attribute_name, message=f'Column {node.attribute_name} is missing')
+        if node.operation not in self.OPERATOR_MAP:
+            raise ValueError(f'Unknown comparison operator {node.operation}')
+
+        compare = self.OPERATOR_MAP[node.operation]
+        if _is_numeric_array(array) and isinstance(node.value, numbers.Number):
+            mask = np.asarray(compare(array, node.value), dtype=bool)
+        else:
+            # there are cases where the attributes are none -> those rows are never kept
+            indices = np.flatnonzero(_not_null(array))
+            keep = np.asarray(compare(array[indices].astype(object), node.value), dtype=bool)
+            return child.take(indices[keep])
+        return child.take(np.flatnonzero(mask))
+
+    def _run_merge(self, node: Merge, left: ColumnarResult, right: ColumnarResult) -> ColumnarResult:
+        header = left.get_columns() + right.get_columns()
+        if left.length > 0:
+            left_keys = left.column(node.attribute_name0)
+        if right.length > 0:
+            right_keys = right.column(node.attribute_name1)
+        if left.length == 0 or right.length == 0:
+            return ColumnarResult({}, 0, header)
+
+        left_indices, right_indices = self._join_indices(left_keys, right_keys)
+        columns = {name: array[left_indices] for name, array in left.columns.items()}
+        for name, array in right.columns.items():
+            columns[name] = array[right_indices]
+        return ColumnarResult(columns, len(left_indices), header)
+
+    @staticmethod
+    def _join_indices(left_keys: np.ndarray, right_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the index pairs of all rows with equal keys. The pairs keep the order of the row based merge: by
+        right row first, then by left row.
+        """
+        if _is_numeric_array(left_keys) and _is_numeric_array(right_keys):
+            left_order = np.argsort(left_keys, kind='stable')
+            sorted_keys = left_keys[left_order]
+            start = np.searchsorted(sorted_keys, right_keys, side='left')
+            matches = np.searchsorted(sorted_keys, right_keys, side='right') - start
+
+            right_indices = np.repeat(np.arange(len(right_keys)), matches)
+            offsets = np.arange(len(right_indices)) - np.repeat(np.cumsum(matches) - matches, matches)
+            return left_order[np.repeat(start, matches) + offsets], right_indices
+
+        rows_for_key = {}
+        for idx, key in enumerate(left_keys.tolist()):
+            rows_for_key.setdefault(key, []).append(idx)
+
+        left_indices = []
+        right_indices = []
+        for idx, key in enumerate(right_keys.tolist()):
+            matching_rows = rows_for_key.get(key)
+            if matching_rows is not None:
+                left_indices.extend(matching_rows)
+                right_indices.extend([idx] * len(matching_rows))
+        return np.array(left_indices, dtype=np.int64), np.array(right_indices, dtype=np.int64)
+
+    def _run_distinct(self, node: Distinct, child: ColumnarResult) -> ColumnarResult:
+        if node.attribute_name is None:
+            # distinct over whole rows
+            first_index_for_row = {}
+            for index, row in enumerate(zip(*child.columns.values())):
+                first_index_for_row.setdefault(row, index)
+            first_index = np.fromiter(first_index_for_row.values(), dtype=np.int64, count=len(first_index_for_row))
+            return child.take(first_index)
+
+        attribute_names = node.get_projected_attribute_names()
+        if child.length == 0:
+            return ColumnarResult({}, 0, attribute_names)
+
+        array = child.column(node.attribute_name, exception=KeyError, message=node.attribute_name)
+        _, first_index = _group_codes(array)
+        columns = {name: array[first_index] for name, array in child.columns.items() if name in attribute_names}
+        return ColumnarResult(columns, len(first_index), attribute_names)
+
+    def _run_extract_values(self, node: ExtractValues, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return ColumnarResult({}, 0, [])
+        array = child.column(node.attribute_name)
+        return ColumnarResult({node.attribute_name: array}, child.length, [])
+
+    @staticmethod
+    def _single_value(attribute_name: str, value) -> ColumnarResult:
+        if isinstance(value, np.generic):
+            value = value.item()
+        return ColumnarResult({attribute_name: _column_array([value])}, 1, [])
+
+    def _run_sum(self, node: Sum, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return self._single_value(node.attribute_name, None)
+        values = _checked_numbers(child.column(node.attribute_name), node.attribute_name)
+        return self._single_value(node.attribute_name, _sum(values))
+
+    def _run_average(self, node: Average, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return self._single_value(node.attribute_name, 'nan')
+        values = _checked_numbers(child.column(node.attribute_name), node.attribute_name)
+        # rows with a null value count towards the average, like in `Average.run`
+        return self._single_value(node.attribute_name, _sum(values) / child.length)
+
+    def _run_extremum(self, node: Aggregation, child: ColumnarResult, pick: Callable) -> ColumnarResult:
+        if child.length == 0:
+            return self._single_value(node.attribute_name, 'nan')
+        values = _checked_numbers(child.column(node.attribute_name), node.attribute_name)
+        if len(values) == 0:
+            return self._single_value(node.attribute_name, 'nan')
+        return self._single_value(node.attribute_name, pick(values.tolist()))
+
+    def _run_max_aggregation(self, node: MaxAggregation, child: ColumnarResult) -> ColumnarResult:
+        return self._run_extremum(node, child, max)
+
+    def _run_min_aggregation(self, node: MinAggregation, child: ColumnarResult) -> ColumnarResult:
+        return self._run_extremum(node, child, min)
+
+    def _run_count(self, node: Count, child: ColumnarResult) -> ColumnarResult:
+        return self._single_value('count', child.length)
+
+    def _run_extremum_rows(self, node: Operation, child: ColumnarResult, pick: Callable) -> ColumnarResult:
+        if child.length == 0:
+            return ColumnarResult({}, 0, [])
+        array = child.column(node.attribute_name, message=f'Attribute {node.attribute_name} is missing')
+        not_null = _not_null(array)
+        values = array[not_null]
+        if not _is_numeric_array(values) and not all(isinstance(val, numbers.Number) for val in values):
+            raise ValueError(f'Attribute {node.attribute_name} is not numeric')
+        if len(values) == 0:
+            return ColumnarResult({}, 0, [])
+
+        extremum = pick(values.tolist())
+        indices = np.flatnonzero(not_null)
+        return child.take(indices[np.asarray(values == extremum, dtype=bool)], [])
+
+    def _run_max(self, node: Max, child: ColumnarResult) -> ColumnarResult:
+        return self._run_extremum_rows(node, child, max)
+
+    def _run_min(self, node: Min, child: ColumnarResult) -> ColumnarResult:
+        return self._run_extremum_rows(node, child, min)
+
+    def _run_union(self, node: Union, left: ColumnarResult, right: ColumnarResult) -> ColumnarResult:
+        header = left.get_columns()
+        non_empty = [res for res in (left, right) if res.length > 0]
+        if len(non_empty) == 0:
+            return ColumnarResult({}, 0, header)
+        if len(non_empty) == 2 and set(left.columns) != set(right.columns):
+            raise ValueError('Not all dicts of `OpResult` have the same headers')
+
+        columns = {name: _concat([res.columns[name] for res in non_empty]) for name in non_empty[0].columns}
+        return ColumnarResult(columns, left.length + right.length, header)
+
+    @staticmethod
+    def _check_same_columns(left: ColumnarResult, right: ColumnarResult):
+        if ''.join(left.get_columns()) != ''.join(right.get_columns()):
+            raise ValueError('Not all children contain the same columns')
+
+    def _run_intersection(self, node: Intersection, left: ColumnarResult, right: ColumnarResult) -> ColumnarResult:
+        self._check_same_columns(left, right)
+        if left.length > 0:
+            left_values = left.column(node.attribute_name0, exception=KeyError, message=node.attribute_name0)
+        if right.length > 0:
+            right_values = right.column(node.attribute_name1, exception=KeyError, message=node.attribute_name1)
+        if left.length == 0 or right.length == 0:
+            return left.take(np.arange(0))
+        return left.take(np.flatnonzero(_isin(left_values, right_values)))
+
+    def _run_difference(self, node: Difference, left: ColumnarResult, right: ColumnarResult) -> ColumnarResult:
+        self._check_same_columns(left, right)
+        if left.length == 0 or right.length == 0 or set(left.columns) != set(right.columns):
+            return left.take(np.arange(left.length))
+
+        names = list(left.columns)
+        left_rows = zip(*[left.columns[name].tolist() for name in names])
+        right_rows = Counter(zip(*[right.columns[name].tolist() for name in names]))
+
+        # every row of the right table removes the first equal row of the left table
+        kept_indices = []
+        for idx, row in enumerate(left_rows):
+            if right_rows.get(row, 0) > 0:
+                right_rows[row] -= 1
+            else:
+                kept_indices.append(idx)
+        return left.take(np.array(kept_indices, dtype=np.int64))
+
+    @staticmethod
+    def _check_group_columns(child: ColumnarResult, attribute_names: List[str]):
+        for attribute_name in attribute_names:
+            if attribute_name not in child.get_columns():
+                raise ValueError(f'Missing attribute {attribute_name}')
+
+    @staticmethod
+    def _grouped_sums(node: GroupBy, child: ColumnarResult) -> Tuple[np.ndarray, List, List]:
+        """
+        Sums the non-null values of the aggregated column per group. Groups are created by the first non-null value
+        and are returned in that order, together with the sums and the number of summed values.
+        """
+        aggr_attr = node.aggregate_by_attribute_name
+        not_null = _not_null(child.columns[aggr_attr])
+        values = _checked_numbers(child.columns[aggr_attr], aggr_attr)
+        groups = child.columns[node.group_by_attribute_name][not_null]
+        codes, first_index = _group_codes(groups)
+
+        # `np.add.at` adds in row order (also for object arrays), just like the row based operations
+        sums = np.zeros(len(first_index), dtype=values.dtype)
+        np.add.at(sums, codes, values)
+        counts = np.bincount(codes, minlength=len(first_index))
+        return groups[first_index], sums.tolist(), counts.tolist()
+
+    @staticmethod
+    def _grouped_result(node: GroupBy, keys: np.ndarray, aggregated: List, aggr_attr: str) -> ColumnarResult:
+        group_attr = node.group_by_attribute_name
+        return ColumnarResult({group_attr: keys, aggr_attr: _column_array(aggregated)}, len(keys),
+                              [group_attr, aggr_attr])
+
+    def _run_average_by(self, node: AverageBy, child: ColumnarResult) -> ColumnarResult:
+        group_attr = node.group_by_attribute_name
+        aggr_attr = node.aggregate_by_attribute_name
+        self._check_group_columns(child, [group_attr, aggr_attr])
+        if child.length == 0:
+            return ColumnarResult({}, 0, [group_attr, aggr_attr])
+
+        keys, sums, counts = self._grouped_sums(node, child)
+        averages = [summed / count for summed, count in zip(sums, counts)]
+        return self._grouped_result(node, keys, averages, aggr_attr)
+
+    def _run_sum_by(self, node: SumBy, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return ColumnarResult({}, 0, [])
+        self._check_group_columns(child, [node.group_by_attribute_name, node.aggregate_by_attribute_name])
+
+        keys, sums, _ = self._grouped_sums(node, child)
+        return self._grouped_result(node, keys, sums, node.aggregate_by_attribute_name)
+
+    def _run_count_by(self, node: CountBy, child: ColumnarResult) -> ColumnarResult:
+        if child.length == 0:
+            return ColumnarResult({}, 0, [])
+        group_attr = node.group_by_attribute_name
+        self._check_group_columns(child, [group_attr])
+        codes, first_index = _group_codes(child.columns[group_attr])
+        counts = np.bincount(codes, minlength=len(first_index)).tolist()
+        return self._grouped_result(node, child.columns[group_attr][first_index], counts, 'count')
+
+    def _run_done(self, node: Done, child: ColumnarResult) -> ColumnarResult:
+        return child
+
+    def _run_is_empty(self, node: IsEmpty, child: ColumnarResult) -> ColumnarResult:
+        column_name = 'is_empty'
+        return ColumnarResult({column_name: _column_array([child.length == 0])}, 1, [column_name])
@@ -2,48 +2,161 @@ import re
 import inspect
 import operator
 import numbers
+import hashlib
+import functools
 
 from abc import abstractmethod, ABC
 
-from typing import List, Tuple
+from typing import List, NamedTuple, Sequence, Tuple
 from enum import Enum, auto
 from collections import defaultdict
 from semql.execution import OpResult
 from semql.data_sources import BaseDataSource, SqliteDataSource
+from semql.result_cache import execute_sql
 from semql.sql_execution.sql_generation_helper import *
+from semql.core.traversal import iter_preorder, iter_postorder, iter_postorder_with_ids, iter_leaves, first_leaf
 
 primitive_types = {str, int, float, bool, type(None)}
 
 
+def _cached_print(print_fn):
+    @functools.wraps(print_fn)
+    def print(self):
+        printed = self._printed
+        if printed is None:
+            printed = self._printed = print_fn(self)
+        return printed
+    return print
+
+
+class OperationSchema(NamedTuple):
+    """
+    Constructor signature of an operation class, computed once when the class is created.
+    """
+    # arguments annotated with an operation type, in the order of `children`
+    children: Tuple[str, ...]
+    # arguments annotated with any other type, the arguments written by `to_json`
+    arguments: Tuple[str, ...]
+    # every argument stored by the node (`_fields`)
+    fields: Tuple[str, ...]
+
+
 class Operation(ABC):
-    op_result: OpResult = None
-    parent: 'Operation' = None
-    tokens: List = []
-    children: List['Operation'] = []
-    sql_statement: str = None
-    data_src: BaseDataSource = None
-    data_src_name: str = None
-    score: int = 0
+    """
+    Nodes are slotted: every class declares the arguments it stores in `__slots__` (in the order of its constructor)
+    and `_fields` lists the arguments of a class including the inherited ones. The equality and copy helpers only
+    look at `_fields`, the execution state (results, SQL statements, data sources) is not part of a node's identity.
+
+    The fingerprint, `print()` and `print_node()` (used as hash) of a node are cached. Code that changes the arguments
+    or the children of an existing node has to call `invalidate()` afterwards, `set_children()` and the tree editing
+    helpers below do that already. Copies start with empty caches and the equality helpers always compare the
+    arguments, so a missed `invalidate()` only leaves a stale `print()` or fingerprint of the edited node.
+    """
+    __slots__ = ('op_result', 'parent', 'tokens', 'children', 'sql_statement', 'data_src', 'data_src_name', 'score',
+                 '_fingerprint', '_printed', '_label')
+    _fields: Tuple[str, ...] = ()
+    _schema: OperationSchema = OperationSchema((), (), ())
+    # every operation class by name
+    _registry: Dict[str, type] = {}
+
+    op_result: OpResult
+    parent: 'Operation'
+    tokens: Sequence
+    children: List['Operation']
+    sql_statement: str
+    data_src: BaseDataSource
+    data_src_name: str
+    score: int
 
     def __init__(self):
-        super().__init__()
+        self._fingerprint = None
+        self._printed = None
+        self._label = None
+        self.op_result = None
+        self.parent = None
+        self.tokens = ()
+        self.children = []
+        self.sql_statement = None
+        self.data_src = None
+        self.data_src_name = None
+        self.score = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            if issubclass(klass, Operation) and klass is not Operation:
+                fields.extend(name for name in klass.__dict__.get('__slots__', ()) if name not in fields)
+        cls._fields = tuple(fields)
+        annotations = inspect.getfullargspec(cls.__init__).annotations
+        cls._schema = OperationSchema(
+            children=tuple(arg_name for arg_name, arg_type in annotations.items()
+                           if isinstance(arg_type, type) and issubclass(arg_type, Operation)),
+            arguments=tuple(arg_name for arg_name, arg_type in annotations.items()
+                            if isinstance(arg_type, type) and not issubclass(arg_type, Operation)),
+            fields=cls._fields)
+        Operation._registry[cls.__name__] = cls
+        if 'print' in cls.__dict__:
+            cls.print = _cached_print(cls.__dict__['print'])
+
+    def invalidate(self):
+        """
+        Clears the cached fingerprint, `print()` and `print_node()` of this node and of all its ancestors.
+        """
+        node = self
+        while node is not None:
+            node._fingerprint = None
+            node._printed = None
+            node._label = None
+            node = node.parent
+
+    def node_key(self) -> Tuple:
+        """
+        Returns the operation and the arguments of this node (without its children), values of different types are
+        kept apart (e.g. `1` and `'1'`).
+        """
+        return (type(self).__name__,) + tuple(
+            (name, type(val).__name__, val if type(val) in primitive_types else repr(val))
+            for name, val in self.get_arguments().items())
+
+    def fingerprint(self) -> str:
+        """
+        Returns a Merkle hash of the subtree rooted at this node: the hash of `node_key()` and the fingerprints of the
+        children. Structurally equal subtrees have equal fingerprints, also across processes. The fingerprint is
+        cached, so after the first call it is returned in O(1).
+        """
+        fingerprint = self._fingerprint
+        if fingerprint is None:
+            digest = hashlib.blake2b(repr(self.node_key()).encode('utf-8'), digest_size=16)
+            for child in self.children:
+                digest.update(child.fingerprint().encode('ascii'))
+            fingerprint = self._fingerprint = digest.hexdigest()
+        return fingerprint
+
+    def get_arguments(self) -> Dict:
+        """
+        Returns the arguments of this node (without its children) by name.
+        """
+        return {name: getattr(self, name) for name in self._fields}
+
+    def _primitive_args(self, exclude: Tuple[str, ...] = (), skip_none: bool = False) -> Dict:
+        args = {}
+        for name in self._fields:
+            val = getattr(self, name)
+            if type(val) in primitive_types and name not in exclude and not (skip_none and val is None):
+                args[name] = val
+        return args
 
     def _set_datasource(self, data_source=None):
 
         if not isinstance(self, NoOp):
             if data_source is None:
-                leaves = self.return_leaves()
-                get_data_node = leaves[0]
-                if isinstance(get_data_node, GetData):
-                    data_source = get_data_node.data_source
-                else:
-                    raise ValueError('The leaves are not get data nodes.')
+                data_source = self._get_data_source_name()
             self.data_src_name = data_source
             self.data_src = BaseDataSource.get(data_source)
 
     def _get_data_source_name(self):
-        leaves = self.return_leaves()
-        get_data_node = leaves[0]
+        get_data_node = first_leaf(self)
         if isinstance(get_data_node, GetData):
             data_source = get_data_node.data_source
         else:
@@ -67,7 +180,7 @@ class Operation(ABC):
 
     @staticmethod
     def get_op_dict() -> Dict[str, type]:
-        return {op.__name__: op for op in Operation.get_op_classes()}
+        return dict(Operation._registry)
 
     def print(self):
         raise NotImplementedError
@@ -91,49 +204,44 @@ class Operation(ABC):
         return operation.children
 
     def set_children(self, children: List['Operation']):
+        """
+        Sets the children and invalidates the cached fingerprint and `print()` of this node and its ancestors.
+        """
         self.children = children
+        self.invalidate()
 
     def to_json(self, node_id: str, store_results=False, preview_data=-1) -> List[Dict]:
-        children_json = []
-        for child_idx, child_node in enumerate(self.children):
-            child_json = child_node.to_json(node_id + str(child_idx), store_results=store_results,
-                                            preview_data=preview_data)
-            children_json.extend(child_json)
-
-        child_arg_names = [arg_name for arg_name, arg_type in
-                           inspect.getfullargspec(type(self).__init__).annotations.items()
-                           if isinstance(arg_type, type) and issubclass(arg_type, Operation)]
-
-        children = {node_id + str(i): arg_name for i, arg_name in enumerate(child_arg_names)}
+        """
+        Returns the JSON of every node of the tree, children come before their parents.
+        """
+        return [node._node_json(child_id, store_results, preview_data)
+                for child_id, node in iter_postorder_with_ids(self, node_id)]
 
-        node_arguments = [arg_name for arg_name, arg_type in
-                          inspect.getfullargspec(type(self).__init__).annotations.items()
-                          if isinstance(arg_type, type) and not issubclass(arg_type, Operation)]
+    def _node_json(self, node_id: str, store_results: bool, preview_data: int) -> Dict:
+        schema = self._schema
+        children = {node_id + str(i): arg_name for i, arg_name in enumerate(schema.children)}
 
         this_json = {
             'node_id': node_id,
             'operation': self.__class__.__name__,
             'children': children,
             'label': self.print_node(),
-            'arguments': {arg_name: arg_value for arg_name, arg_value in self.__dict__.items() if
-                          arg_name in node_arguments},
+            'arguments': {arg_name: getattr(self, arg_name) for arg_name in schema.arguments},
             'tokens': self.tokens,
             'score': self.score
         }
         if store_results:
             if preview_data < 0:
-                this_json['results'] = self.op_result.get_data()
+                this_json['results'] = self.op_result.copy_data()
             else:
                 preview_results = []
-                result_length = len(self.op_result._data_dicts)
+                result_length = len(self.op_result)
                 for i in range(min([result_length, preview_data])):
                     preview_results.append(self.op_result.get(i))
                 this_json['results'] = preview_results
                 this_json['result_length'] = result_length
 
-        return children_json + [this_json]
-
-        pass
+        return this_json
 
     @abstractmethod
     def print_node(self):
@@ -150,40 +258,23 @@ class Operation(ABC):
         if not type(self) == type(other_node):
             return False
 
+        exclude = ('value',) if ignore_value else ()
+        self_args = self._primitive_args(exclude)
         if not partial_eq:
-            if ignore_value:
-                self_args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types and not var in ['parent', 'value']}
-                other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types and not var in ['parent', 'value']}
-            else:
-                self_args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types}
-                other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types and not var == 'parent'}
-
-            return self_args == other_args
+            return self_args == other_node._primitive_args(exclude)
         else:
             #ignore None attributes in other_node
-            if ignore_value:
-                self_args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types and not var in ['parent', 'value']}
-                other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types and val is not None and not var in ['parent', 'value']}
-            else:
-                self_args = {var: val for var, val in self.__dict__.items() if  type(val) in primitive_types and not var in ['parent']}
-                other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types and val is not None and not var in ['parent']}
-
-            args_equalities = [val == self_args[var] for var, val in other_args.items()]
+            other_args = other_node._primitive_args(exclude, skip_none=True)
+            args_equalities = [val == self_args.get(var) for var, val in other_args.items()]
             return not False in args_equalities
 
-
     def node_object_equality(self, other_node: 'Operation') -> bool:
-        self_args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types}
-        other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types}
-
-        return self_args == other_args and type(self) == type(other_node) and id(self) == id(other_node)
+        return self is other_node
 
     def deep_equality(self, other_node: 'Operation'):
         if not type(self) == type(other_node):
             return False
-        self_args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types}
-        other_args = {var: val for var, val in other_node.__dict__.items() if type(val) in primitive_types}
-        if not self_args == other_args:
+        if not self._primitive_args() == other_node._primitive_args():
             return False
         for my_child, other_child in zip(self.children, other_node.children):
             if not my_child.deep_equality(other_child):
@@ -210,28 +301,50 @@ class Operation(ABC):
                 return False
         return True
 
-    def shallow_copy(self):
-        args = {var: val for var, val in self.__dict__.items() if type(val) in primitive_types}
-        obj = type(self)()
-        for k, v in args.items():
-            obj.__dict__[k] = v
+    def _copy_node(self) -> 'Operation':
+        # copies the arguments without calling the constructor, the children are set by the caller
+        cls = type(self)
+        obj = cls.__new__(cls)
+        Operation.__init__(obj)
+        for name in self._fields:
+            val = getattr(self, name)
+            # e.g. the `attrs` of `ProjectionRoot`, the copy must not share them with the original
+            if type(val) is list:
+                val = list(val)
+            setattr(obj, name, val)
+        obj.sql_statement = self.sql_statement
+        obj.data_src_name = self.data_src_name
+        obj.score = self.score
         obj.op_result = self.op_result
         obj.tokens = self.tokens
         return obj
 
+    def shallow_copy(self):
+        obj = self._copy_node()
+        obj.children = [NoOp() for _ in self.children]
+        for child in obj.children:
+            child.parent = obj
+        return obj
+
     def deepcopy(self) -> 'Operation':
-        instance = self.shallow_copy()
-        new_children = []
-        for child in self.children:
-            new_child = child.deepcopy()
-            new_child.parent = instance
-            new_children.append(new_child)
-        instance.children = new_children
-        return instance
+        root_copy = None
+        stack = [(self, None)]
+        while stack:
+            node, parent_copy = stack.pop()
+            instance = node._copy_node()
+            if parent_copy is None:
+                root_copy = instance
+            else:
+                # the children of a node are visited from left to right
+                instance.parent = parent_copy
+                parent_copy.children.append(instance)
+            stack.extend((child, instance) for child in reversed(node.children))
+        return root_copy
 
     def replace_op(self, old_op: 'Operation'):
         """
         Here this Operation replaces the old Operation. It sets the replaces the child of the parent and sets this Operations parent to the old Operations parent.
+        The caches of the parent and its ancestors are invalidated.
         :param old_op: Which Operation to replace in the tree.
         :return: None
         """
@@ -240,10 +353,12 @@ class Operation(ABC):
         child_idx = child_indices[0]
         self.parent = parent_op
         parent_op.children[child_idx] = self
+        parent_op.invalidate()
 
     def copy_parent_from_op(self, operation: 'Operation'):
         """
         This function copies the parent of another Operation to serve as parent for this Operation.
+        The copied parent starts with empty caches.
         :param operation: other Operation to copy the parent from
         :return: None
         """
@@ -251,11 +366,13 @@ class Operation(ABC):
         child_idx = [idx for idx, child in enumerate(operation.parent.children) if child.deep_equality(operation)][0]
         new_root.parent = None
         new_root.children[child_idx] = self
+        new_root.invalidate()
         self.parent = new_root
 
     def insert_node_on_path(self, cls: type, args: Dict) -> bool:
         """
-        Inserts a new Operation as parent of this Operation.
+        Inserts a new Operation as parent of this Operation. The caches of its former parent and the ancestors are
+        invalidated.
         :param cls: Class Type of the new Operation
         :param op_attribute_name:  attribute_name in the constructor of the new Class to which this Operation is the argument
         :param args: other arguments of the class
@@ -267,6 +384,7 @@ class Operation(ABC):
             child_idx = [idx for idx, child in enumerate(parent_node.children) if child.node_object_equality(self)][0]
             op.parent = parent_node
             parent_node.children[child_idx] = op
+            parent_node.invalidate()
             return False
         else:
             return True
@@ -276,14 +394,7 @@ class Operation(ABC):
         Returns a list of all the leaf Operations in the Tree (either GetData or NoOps)
         :return: List of leaf Operations
         """
-        if len(self.children) == 0:
-            return [self]
-
-        leaves = []
-        for operation in self.children:
-            child_leaves = operation.return_leaves()
-            leaves.extend(child_leaves)
-        return leaves
+        return list(iter_leaves(self))
 
     def get_path_to_root(self, root: 'Operation' = None) -> List['Operation']:
         path = []
@@ -298,23 +409,13 @@ class Operation(ABC):
         pass
 
     def list_of_nodes(self) -> List['Operation']:
-        tree_list = [self]
-        for child in self.children:
-            child_nodes = child.list_of_nodes()
-            tree_list.extend(child_nodes)
-        return tree_list
+        return list(iter_preorder(self))
 
     def execute_sql_and_set_result(self, preview_limit: int):
         if self.sql_statement:
             self._set_datasource()
             statement_wrapped = wrap_statement_in_select(self.sql_statement, preview_limit)
-            try:
-                result_dicts, columns = self.data_src.execute_sql(statement_wrapped)
-            except Exception as e:
-                self.data_src.conn.close()
-                raise e
-            self.set_result(OpResult(result_dicts, columns))
-            self.data_src.conn.close()
+            self.set_result(execute_sql(self.data_src_name, self.data_src, statement_wrapped))
 
     def __eq__(self, other):
         return self.node_equality(other)
@@ -326,10 +427,16 @@ class Operation(ABC):
         return self.print_node()
 
     def __hash__(self):
-        return hash(self.print_node())
+        label = self._label
+        if label is None:
+            label = self._label = self.print_node()
+        return hash(label)
 
-    def _set_and_return_result(self, rows: List[Dict], columns: List[str]) -> OpResult:
-        new_op_res = OpResult(rows, columns)
+    def _set_and_return_result(self, rows: List[Dict], columns: List[str], validate: bool = True) -> OpResult:
+        """
+        Operations that only produce rows with the same keys pass `validate=False` to skip the validation of every row.
+        """
+        new_op_res = OpResult(rows, columns) if validate else OpResult.from_trusted(rows, columns)
         self.set_result(new_op_res)
         return new_op_res
 
@@ -338,26 +445,28 @@ class Operation(ABC):
 
 
 class TableOperation(Operation):
-    pass
+    __slots__ = ()
 
 
 class BoolOperation(Operation):
-    pass
+    __slots__ = ()
 
 
 class NumericOperation(Operation):
-    pass
+    __slots__ = ()
 
 
 class ListOperation(Operation):
-    pass
+    __slots__ = ()
 
 
 class FinalOperation(Operation):
-    pass
+    __slots__ = ()
 
 
 class NoOp(Operation):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.children = []
@@ -381,6 +490,8 @@ class NoOp(Operation):
 
 
 class SetOperations(TableOperation):
+    __slots__ = ('attribute_name0', 'attribute_name1', 'setop')
+
     def __init__(self, table0: TableOperation = None, table1: TableOperation = None, attribute_name0: str = None,
                  attribute_name1: str = None):
         super().__init__()
@@ -408,6 +519,8 @@ class SetOperations(TableOperation):
 
 
 class Done(FinalOperation):
+    __slots__ = ()
+
     def __init__(self, result: ListOperation = None):
         super().__init__()
         if result is None:
@@ -416,9 +529,10 @@ class Done(FinalOperation):
         self.children = [result]
 
     def run(self) -> 'OpResult':
-        return self._set_and_return_result(
-            self.children[0].get_result().get_data(), self.children[0].get_result().get_columns()
-        )
+        # the rows are passed on unchanged, so the result of the child can be shared
+        new_op_res = self.children[0].get_result().copy()
+        self.set_result(new_op_res)
+        return new_op_res
 
     def print(self):
         return "done({})".format(self.children[0].print())
@@ -440,6 +554,7 @@ class Done(FinalOperation):
 
 
 class ProjectionRoot(FinalOperation):
+    __slots__ = ('attrs', 'distinct')
 
     class ProjectionFN:
         NONE = auto()
@@ -499,6 +614,10 @@ class ProjectionRoot(FinalOperation):
         distinct = f"distinct = {self.distinct}"
         return f"ProjectionRoot({attrs}, {distinct})"
 
+    def node_key(self) -> Tuple:
+        # the projection functions are compared by identity, their repr is the same for all of them
+        return type(self).__name__, tuple(self.attr2txt(attr_name, fn) for attr_name, fn in self.attrs), self.distinct
+
     def print_noargs(self):
         sub = self.children[0].print_noargs()
         return f"ProjectionRoot({sub})"
@@ -521,6 +640,8 @@ class ProjectionRoot(FinalOperation):
 
 
 class IsEmpty(FinalOperation):
+    __slots__ = ()
+
     def __init__(self, result: ListOperation = None):
         super().__init__()
         if result is None:
@@ -552,6 +673,8 @@ class IsEmpty(FinalOperation):
 
 
 class Distinct(TableOperation):
+    __slots__ = ('attribute_name', 'ignore_primary_key')
+
     # TODO mayba change to Distince(table, attr_name)
     def __init__(self, result: TableOperation = None, attribute_name: str = None, ignore_primary_key=False):
         super().__init__()
@@ -572,48 +695,59 @@ class Distinct(TableOperation):
         return '{}({})'.format(self.get_label(self), self.attribute_name)
 
     def run(self) -> 'OpResult':
-        # super()._set_datasource()
-        kept_rows = []
-        child_rows = self.children[0].get_result().get_data()
-        distinct_indices = []
-        distinct_values = set()
-        data_src_name = self._get_data_source_name()
-        is_primary_key = is_attribute_primary_key(*self.attribute_name.split("."), data_src_name)
-        if is_primary_key:
-            # keep attributes of entity
-            table_name = self.attribute_name.split(".")[0]
-            attr2alias = get_attributes_with_aliases_for_table(table_name, data_src_name)
-            attribute_names = ['{}.{}'.format(table_name, attr) for attr in list(attr2alias.keys())]
+        child_result = self.children[0].get_result()
+        child_rows = child_result.get_data()
+        if self.attribute_name is None:
+            # distinct over whole rows
+            attribute_names = list(child_result.get_columns())
         else:
-            attribute_names = [self.attribute_name]
-
-        if len(child_rows) > 0:
-            for index, row in enumerate(child_rows):
-                if self.attribute_name is None:
-                    if frozenset(row) not in distinct_values:
-                        distinct_values.add(frozenset(row))
-                        distinct_indices.append(index)
-                else:
-                    if row[self.attribute_name] not in distinct_values:
-                        distinct_indices.append(index)
-                        distinct_values.add(row[self.attribute_name])
-
-            for index in distinct_indices:
-                row = child_rows[index]
-                projected_row = {}
-                for k, v in row.items():
-                    if k in attribute_names:
-                        projected_row[k] = v
-                kept_rows.append(projected_row)
-
-        return self._set_and_return_result(kept_rows, attribute_names)
+            attribute_names = self.get_projected_attribute_names()
+
+        if len(child_rows) == 0:
+            return self._set_and_return_result([], attribute_names)
+
+        # all rows have the keys of the first row, so the key and the projection are only computed once
+        first_row = child_rows[0]
+        key_columns = tuple(first_row) if self.attribute_name is None else (self.attribute_name,)
+        attribute_set = set(attribute_names)
+        projected_columns = tuple(col for col in first_row if col in attribute_set)
+
+        get_key = operator.itemgetter(*key_columns)
+        distinct_rows = {}
+        for row in child_rows:
+            key = get_key(row)
+            if key not in distinct_rows:
+                distinct_rows[key] = row
+
+        kept_rows = [{col: row[col] for col in projected_columns} for row in distinct_rows.values()]
+        return self._set_and_return_result(kept_rows, attribute_names, validate=False)
+
+    def get_projected_attribute_names(self) -> List[str]:
+        """
+        Returns the attributes kept by the operation: all attributes of the entity if `attribute_name` is its primary
+        key, only `attribute_name` otherwise.
+        """
+        table_name, attribute = self.attribute_name.split(".")
+        table_index = get_table_index(table_name, self._get_data_source_name())
+        if attribute in table_index.primary_keys:
+            # keep attributes of entity
+            return list(table_index.qualified_attributes)
+        return [self.attribute_name]
 
     def to_sql(self, save_intermediate_result: bool = False, preview_limit: int = 0) -> str:
         ##super()._set_datasource()
+        if self.attribute_name is None:
+            self.sql_statement = ' SELECT DISTINCT * FROM ( ' \
+                                 + self.children[0].to_sql(save_intermediate_result, preview_limit) + ' )'
+            if save_intermediate_result:
+                self.execute_sql_and_set_result(preview_limit)
+            return self.sql_statement
+
         data_src_name = self._get_data_source_name()
-        if is_attribute_primary_key(*self.attribute_name.split("."), data_src_name) and not self.ignore_primary_key:
-            self.sql_statement = ' SELECT DISTINCT ' + get_aliases_for_table(self.attribute_name.split(".")[0],
-                                                                             data_src_name) + ' FROM ( ' \
+        table_name, attribute = self.attribute_name.split(".")
+        table_index = get_table_index(table_name, data_src_name)
+        if attribute in table_index.primary_keys and not self.ignore_primary_key:
+            self.sql_statement = ' SELECT DISTINCT ' + table_index.alias_projection + ' FROM ( ' \
                                  + self.children[0].to_sql(save_intermediate_result, preview_limit) + ' )'
         else:
             self.sql_statement = ' SELECT DISTINCT ' + get_attribute_alias(*self.attribute_name.split(".")) + ' FROM ( ' \
@@ -624,6 +758,8 @@ class Distinct(TableOperation):
 
 
 class ExtractValues(ListOperation):
+    __slots__ = ('attribute_name',)
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         if table is None:
             table = NoOp()
@@ -643,7 +779,7 @@ class ExtractValues(ListOperation):
                 extracted_val.append(row[self.attribute_name])
 
         op_res_dicts = [{self.attribute_name: x} for x in extracted_val]
-        return self._set_and_return_result(op_res_dicts, extracted_col)
+        return self._set_and_return_result(op_res_dicts, extracted_col, validate=False)
 
     def print(self):
         return "extractValues({},{})".format(self.children[0].print(), self.attribute_name)
@@ -664,6 +800,8 @@ class ExtractValues(ListOperation):
 
 
 class Aggregation(FinalOperation):
+    __slots__ = ('attribute_name',)
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super().__init__()
         if table is None:
@@ -680,6 +818,8 @@ class Aggregation(FinalOperation):
 
 
 class Sum(Aggregation):
+    __slots__ = ()
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super(Sum, self).__init__(table, attribute_name)
 
@@ -718,6 +858,8 @@ class Sum(Aggregation):
 
 
 class Average(Aggregation):
+    __slots__ = ()
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super(Average, self).__init__(table, attribute_name)
 
@@ -761,6 +903,7 @@ class Average(Aggregation):
 
 
 class MaxAggregation(Aggregation):
+    __slots__ = ()
 
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super(MaxAggregation, self).__init__(table, attribute_name)
@@ -815,6 +958,7 @@ class MaxAggregation(Aggregation):
 
 
 class MinAggregation(Aggregation):
+    __slots__ = ()
 
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super(MinAggregation, self).__init__(table, attribute_name)
@@ -869,6 +1013,8 @@ class MinAggregation(Aggregation):
 
 
 class Count(FinalOperation):
+    __slots__ = ()
+
     def __init__(self, table: TableOperation = None):
         super().__init__()
         if table is None:
@@ -899,6 +1045,8 @@ class Count(FinalOperation):
 
 
 class Max(TableOperation):
+    __slots__ = ('attribute_name',)
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super().__init__()
         if table is None:
@@ -956,6 +1104,8 @@ class Max(TableOperation):
 
 
 class Min(TableOperation):
+    __slots__ = ('attribute_name',)
+
     def __init__(self, table: TableOperation = None, attribute_name: str = None):
         super().__init__()
         if table is None:
@@ -1014,6 +1164,8 @@ class Min(TableOperation):
 
 
 class Union(SetOperations):
+    __slots__ = ()
+
     def __init__(self, table0: TableOperation = None, table1: TableOperation = None, attribute_name0: str = None,
                  attribute_name1: str = None):
         super(Union, self).__init__(table0, table1, attribute_name0, attribute_name1)
@@ -1024,7 +1176,7 @@ class Union(SetOperations):
         new_result = []
 
         for res in children_results:
-            new_result = new_result + res.get_data()
+            new_result.extend(res.get_data())
 
         return self._set_and_return_result(new_result, self.children[0].get_result().get_columns())
 
@@ -1041,6 +1193,8 @@ class Union(SetOperations):
 
 
 class Intersection(SetOperations):
+    __slots__ = ()
+
     def __init__(self, table0: TableOperation = None, table1: TableOperation = None, attribute_name0: str = None,
                  attribute_name1: str = None):
         super(Intersection, self).__init__(table0, table1, attribute_name0, attribute_name1)
@@ -1087,6 +1241,8 @@ class Intersection(SetOperations):
 
 
 class Difference(SetOperations):
+    __slots__ = ()
+
     def __init__(self, table0: TableOperation = None, table1: TableOperation = None, attribute_name0: str = None,
                  attribute_name1: str = None):
         super(Difference, self).__init__(table0, table1, attribute_name0, attribute_name1)
@@ -1094,7 +1250,7 @@ class Difference(SetOperations):
 
     def run(self) -> 'OpResult':
         children_results = [c.get_result() for c in self.children]
-        difference_results = children_results[0].get_data()
+        difference_results = list(children_results[0].get_data())
         children_results = children_results[1:]
 
         children_header = [c.get_result().get_columns() for c in self.children]
@@ -1127,6 +1283,8 @@ class Difference(SetOperations):
 
 
 class GroupBy(TableOperation):
+    __slots__ = ('group_by_attribute_name', 'aggregate_by_attribute_name')
+
     def __init__(self, table: TableOperation = None, group_by_attribute_name: str = None,
                  aggregate_by_attribute_name: str = None):
         super().__init__()
@@ -1146,6 +1304,8 @@ class GroupBy(TableOperation):
 
 
 class AverageBy(GroupBy):
+    __slots__ = ()
+
     def run(self) -> 'OpResult':
         child_result = self.children[0].get_result()
         child_data = child_result.get_data()
@@ -1207,6 +1367,8 @@ class AverageBy(GroupBy):
 
 
 class SumBy(GroupBy):
+    __slots__ = ()
+
     def run(self) -> 'OpResult':
         child_result = self.children[0].get_result()
         child_data = child_result.get_data()
@@ -1265,6 +1427,8 @@ class SumBy(GroupBy):
 
 
 class CountBy(GroupBy):
+    __slots__ = ()
+
     def run(self) -> 'OpResult':
         child_result = self.children[0].get_result()
         child_data = child_result.get_data()
@@ -1311,6 +1475,8 @@ class CountBy(GroupBy):
 
 
 class Merge(TableOperation):
+    __slots__ = ('attribute_name0', 'attribute_name1')
+
     def __init__(self, table0: TableOperation = None, table1: TableOperation = None, attribute_name0: str = None,
                  attribute_name1: str = None):
         super().__init__()
@@ -1354,7 +1520,7 @@ class Merge(TableOperation):
             if len(rows_with_attr) > 0:
                 merged_data += list(map(lambda l: {**l, **r_row}, rows_with_attr))
 
-        return self._set_and_return_result(merged_data, merged_columns)
+        return self._set_and_return_result(merged_data, merged_columns, validate=False)
 
     def print(self):
         return "merge({},{},{},{})".format(self.children[0].print(), self.children[1].print(), self.attribute_name0,
@@ -1378,6 +1544,8 @@ class Merge(TableOperation):
 
 
 class Filter(TableOperation):
+    __slots__ = ('attribute_name', 'operation', 'value')
+
     OPERATOR_MAP = {
         '=': operator.eq,
         '==': operator.eq,
@@ -1420,7 +1588,7 @@ class Filter(TableOperation):
         child_data = child_result.get_data()
         child_header = child_result.get_columns()
         result_data = list(filter(_filter_data, child_data))
-        return self._set_and_return_result(result_data, child_header)
+        return self._set_and_return_result(result_data, child_header, validate=False)
 
     def print(self):
         return "filter({},{},{},{})".format(self.children[0].print(), self.attribute_name, self.operation, self.value)
@@ -1450,6 +1618,8 @@ class Filter(TableOperation):
 
 
 class GetData(TableOperation):
+    __slots__ = ('data_source', 'table_name')
+
     def __init__(self, data_source: str = '', table_name: str = None):
         super().__init__()
         self.data_source = data_source
@@ -1458,11 +1628,10 @@ class GetData(TableOperation):
 
     def run(self) -> 'OpResult':
         super()._set_datasource(self.data_source)
-        attr2alias = get_attributes_with_aliases_for_table(self.table_name, self.data_source)
-        result = self._set_and_return_result(
-            *self.data_src.get_data_and_project(self.table_name, list(attr2alias.keys())))
-        self.data_src.conn.close()
-        return result
+        table_index = get_table_index(self.table_name, self.data_source)
+        new_op_res = OpResult.from_rows(*self.data_src.get_rows_and_project(self.table_name, list(table_index.attributes)))
+        self.set_result(new_op_res)
+        return new_op_res
 
     def print(self):
         return "getData({})".format(self.table_name)
@@ -1474,13 +1643,7 @@ class GetData(TableOperation):
         return 'GetData()'
 
     def to_sql(self, save_intermediate_result: bool = False, preview_limit: int = 0) -> str:
-        attr2alias = get_attributes_with_aliases_for_table(self.table_name, self.data_source)
-        projection = ''
-        attr2alias_items = list(attr2alias.items())
-        for attr, alias in attr2alias_items[:-1]:
-            projection += escape_phrase(attr) + ' AS ' + get_value_for_statement(alias) + ', '
-        last_attr, last_alias = attr2alias_items[-1]
-        projection += escape_phrase(last_attr) + ' AS ' + get_value_for_statement(last_alias)
+        projection = get_table_index(self.table_name, self.data_source).select_projection
         self.sql_statement = ' (SELECT ' + projection + ' FROM ' + escape_phrase(self.table_name) + ') '
         if save_intermediate_result:
             self.execute_sql_and_set_result(preview_limit)
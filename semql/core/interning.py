@@ -0,0 +1,110 @@
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from semql.core.ast import Operation, primitive_types
+
+
+class OperationInterner:
+    """
+    Hash-consing factory for operation trees. Every distinct (operation, arguments, children) exists only once, so the
+    trees built with one interner (e.g. all beams of one question) share their common subtrees, typically the
+    `GetData`/`Merge` spine.
+
+    Shared nodes must not be changed and their `parent` is the parent they were created for, not necessarily the one
+    of the tree at hand. Use `replace_op()`/`insert_node_on_path()` of the interner to edit such a tree (they copy the
+    path to the root and leave all other trees untouched), and `deepcopy()` the tree for code that edits trees in place
+    or walks up the parents (e.g. the tree sampling or the text generation).
+    """
+
+    def __init__(self):
+        self._nodes: Dict[Tuple, Operation] = {}
+        self._calls: Dict[Tuple, Operation] = {}
+        self._memo: Dict[Hashable, Operation] = {}
+        self._interned: Dict[int, Operation] = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def make(self, cls: type, *args, **kwargs) -> Operation:
+        """
+        Returns the shared node for `cls(*args, **kwargs)`, the node is only constructed if it does not exist yet.
+        """
+        args = [self.intern(arg) if isinstance(arg, Operation) else arg for arg in args]
+        kwargs = {name: self.intern(arg) if isinstance(arg, Operation) else arg for name, arg in kwargs.items()}
+        call_key = (cls, tuple(map(self._arg_key, args)),
+                    tuple((name, self._arg_key(arg)) for name, arg in sorted(kwargs.items())))
+        node = self._calls.get(call_key)
+        if node is None:
+            new_node = cls(*args, **kwargs)
+            node = self._calls[call_key] = self._with_children(new_node, new_node.children)
+            if node is not new_node:
+                # an equal node was created before with other (e.g. keyword instead of positional) arguments
+                for child in node.children:
+                    child.parent = node
+        return node
+
+    def intern(self, tree: Operation) -> Operation:
+        """
+        Returns the shared version of the given tree, e.g. of a tree returned by the `Converter`. Nodes of the given
+        tree that are not shared yet become shared nodes, so the tree must not be changed afterwards.
+        """
+        if self._interned.get(id(tree)) is tree:
+            return tree
+        return self._with_children(tree, [self.intern(child) for child in tree.children])
+
+    def memoize(self, key: Hashable, build: Callable[[], Operation]) -> Operation:
+        """
+        Returns the shared node stored for `key`, `build` is only called for keys that were not seen before. This
+        allows parsers to skip parsing a subtree they have already seen (e.g. keyed by its string).
+        """
+        node = self._memo.get(key)
+        if node is None:
+            node = self._memo[key] = self.intern(build())
+        return node
+
+    def replace_op(self, root: Operation, old_op: Operation, new_op: Operation) -> Operation:
+        """
+        Copy-on-write version of `Operation.replace_op`: returns the root of a tree in which every occurrence of
+        `old_op` (identical subtrees are the same node) is replaced by `new_op`. Only the ancestors of `old_op` are
+        copied, `root` and all other trees are not changed.
+        """
+        if root is old_op:
+            return self.intern(new_op)
+        children = [self.replace_op(child, old_op, new_op) for child in root.children]
+        if all(child is old_child for child, old_child in zip(children, root.children)):
+            return root
+        return self._with_children(root, children)
+
+    def insert_node_on_path(self, root: Operation, node: Operation, cls: type, args: Dict) -> Operation:
+        """
+        Copy-on-write version of `Operation.insert_node_on_path`: inserts `cls(**args)` (`args` contain `node` as
+        child) as parent of `node` and returns the new root.
+        """
+        return self.replace_op(root, node, self.make(cls, **args))
+
+    def _with_children(self, node: Operation, children: List[Operation]) -> Operation:
+        """
+        Returns the shared node with the arguments of `node` and the given (shared) children.
+        """
+        key = (node.node_key(), tuple(id(child) for child in children))
+        shared = self._nodes.get(key)
+        if shared is None:
+            if all(child is old_child for child, old_child in zip(children, node.children)):
+                shared = node
+            else:
+                shared = node.shallow_copy()
+                shared.set_children(children)
+                for child in children:
+                    child.parent = shared
+            self._nodes[key] = shared
+            self._interned[id(shared)] = shared
+        return shared
+
+    def _arg_key(self, arg) -> Hashable:
+        if isinstance(arg, Operation):
+            # the children are interned and kept alive by the interner, so their ids are unique
+            return id(arg)
+        elif type(arg) in primitive_types:
+            return type(arg), arg
+        elif isinstance(arg, (list, tuple)):
+            return type(arg), tuple(map(self._arg_key, arg))
+        return arg
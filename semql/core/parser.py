@@ -11,19 +11,28 @@ class TreeParser:
         """
         self.tree_dict = tree_dict
         self.cls_name_to_class = cls_name_to_class
+        self._node_dicts = None
+
+    def _get_node_dict(self, node_id: str) -> Dict:
+        if self._node_dicts is None:
+            self._node_dicts = {}
+            for node_dict in self.tree_dict:
+                self._node_dicts.setdefault(node_dict['node_id'], node_dict)
+        return self._node_dicts[node_id]
 
     def parse_node_dict(self, node_dict: Dict):
+        cls = self.cls_name_to_class[node_dict['operation']]
+
         args = {}
         for k, v in node_dict['arguments'].items():
             args[k] = v
 
         for child_id, child_argname in node_dict['children'].items():
-            child_node_dict = [node_dict for node_dict in self.tree_dict if node_dict['node_id'] == child_id][0]
-            child_object = self.parse_node_dict(child_node_dict)
+            if child_argname not in cls._schema.children:
+                raise ValueError(f'{cls.__name__} has no child argument {child_argname}')
+            child_object = self.parse_node_dict(self._get_node_dict(child_id))
             args[child_argname] = child_object
 
-        cls = self.cls_name_to_class[node_dict['operation']]
-
         operation = cls(**args)
         operation.tokens = node_dict.get('tokens', [])
         return operation
@@ -96,6 +105,5 @@ class TreeParser:
         return self._legacy_recursion(root_op, idx_to_op)
 
     def parse_dict(self) -> Operation:
-        start_dict = [node_dict for node_dict in self.tree_dict if node_dict['node_id'] == '0'][0]
-        tree = self.parse_node_dict(start_dict)
+        tree = self.parse_node_dict(self._get_node_dict('0'))
         return tree
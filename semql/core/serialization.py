@@ -0,0 +1,71 @@
+import marshal
+
+from typing import Dict, Optional
+
+from semql.core.ast import Operation, ProjectionRoot
+from semql.core.traversal import iter_preorder
+
+# Bump this whenever the encoding changes, trees stored with another version cannot be loaded.
+FORMAT_VERSION = 1
+
+_FN_NAMES = {getattr(ProjectionRoot.ProjectionFN, name): name
+             for name in ['NONE', 'SUM', 'AVG', 'MIN', 'MAX', 'COUNT']}
+
+
+def dump_tree(tree: Operation) -> bytes:
+    """
+    Encodes the tree in a compact binary format: the nodes in pre-order, each with the index of its class, the values
+    of its `_schema.fields`, its tokens, its score and its number of children. The arguments have to be builtin values
+    (strings, numbers, lists, ...), the execution state (results, SQL statements) is not stored.
+    """
+    class_ids = {}
+    nodes = []
+    for node in iter_preorder(tree):
+        cls = type(node)
+        class_id = class_ids.setdefault(cls.__name__, len(class_ids))
+        values = tuple(getattr(node, name) for name in cls._schema.fields)
+        if cls is ProjectionRoot:
+            values = ([(attr_name, _FN_NAMES[fn]) for attr_name, fn in node.attrs],) + values[1:]
+        nodes.append((class_id, values, node.tokens, node.score, len(node.children)))
+    return marshal.dumps((FORMAT_VERSION, tuple(class_ids), tuple(nodes)))
+
+
+def load_tree(data: bytes, op_classes: Optional[Dict[str, type]] = None) -> Operation:
+    """
+    Decodes a tree encoded by `dump_tree`. The nodes are not constructed by their constructors, their arguments are
+    set directly.
+    :param op_classes: Mapping between names of classes and the Operation type, all operations by default.
+    """
+    version, class_names, nodes = marshal.loads(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported tree format version {version}')
+    if op_classes is None:
+        op_classes = Operation.get_op_dict()
+    classes = [op_classes[class_name] for class_name in class_names]
+
+    root = None
+    # nodes that still miss children, with the number of missing children
+    open_nodes = []
+    for class_id, values, tokens, score, num_children in nodes:
+        cls = classes[class_id]
+        node = cls.__new__(cls)
+        Operation.__init__(node)
+        for name, val in zip(cls._schema.fields, values):
+            setattr(node, name, val)
+        if cls is ProjectionRoot:
+            node.attrs = [(attr_name, getattr(ProjectionRoot.ProjectionFN, fn)) for attr_name, fn in node.attrs]
+        node.tokens = tokens
+        node.score = score
+
+        if open_nodes:
+            parent = open_nodes[-1]
+            node.parent = parent[0]
+            parent[0].children.append(node)
+            parent[1] -= 1
+            if parent[1] == 0:
+                open_nodes.pop()
+        else:
+            root = node
+        if num_children > 0:
+            open_nodes.append([node, num_children])
+    return root
@@ -81,6 +81,7 @@ def append_op(tree: Operation, candidate_tree: Operation) -> Operation:
         new_op = type(tree)()
         if type(new_op) == GetData:
             new_op.data_source = tree.data_source
+            new_op.invalidate()
         new_op.replace_op(candidate_tree)
         if new_op is not None:
             if new_op.parent is not None:
@@ -99,6 +100,7 @@ def append_op(tree: Operation, candidate_tree: Operation) -> Operation:
             new_op = tree.deepcopy()
             if type(new_op) == GetData:
                 new_op.data_source = tree.data_source
+                new_op.invalidate()
             if candidate_tree.parent is None:
                 return new_op
             new_op.replace_op(candidate_tree)
@@ -0,0 +1,71 @@
+from typing import Iterator, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from semql.core.ast import Operation
+
+# Iterative traversals of operation trees: they do not build intermediate lists per level and are not limited by the
+# recursion depth. Children are always visited from left to right.
+
+
+def iter_preorder(root: 'Operation') -> Iterator['Operation']:
+    """
+    Yields every node before its children.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def iter_postorder(root: 'Operation') -> Iterator['Operation']:
+    """
+    Yields every node after its children.
+    """
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded or not node.children:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+
+
+def iter_postorder_with_ids(root: 'Operation', root_id: str) -> Iterator[Tuple[str, 'Operation']]:
+    """
+    Yields every node after its children together with its id: the id of its parent followed by its child index
+    (the ids used by `Operation.to_json`).
+    """
+    stack = [(root_id, root, False)]
+    while stack:
+        node_id, node, expanded = stack.pop()
+        if expanded or not node.children:
+            yield node_id, node
+        else:
+            stack.append((node_id, node, True))
+            for child_idx in range(len(node.children) - 1, -1, -1):
+                stack.append((node_id + str(child_idx), node.children[child_idx], False))
+
+
+def iter_leaves(root: 'Operation') -> Iterator['Operation']:
+    """
+    Yields the leaves (`GetData` or `NoOp`) from left to right.
+    """
+    for node in iter_preorder(root):
+        if not node.children:
+            yield node
+
+
+def first_leaf(root: 'Operation') -> 'Operation':
+    node = root
+    while node.children:
+        node = node.children[0]
+    return node
+
+
+def last_leaf(root: 'Operation') -> 'Operation':
+    node = root
+    while node.children:
+        node = node.children[-1]
+    return node
@@ -28,8 +28,8 @@ class SQLLiteImport(DataImport):
             new_attributes = []
             for attribute in attributes:
                 new_attribute = (
-                    attribute[0].decode('utf-8').lower(),
-                    attribute[1].decode('utf-8'),
+                    attribute[0].lower(),
+                    attribute[1],
                     attribute[2]
                 )
                 new_attributes.append(new_attribute)
@@ -45,9 +45,9 @@ class SQLLiteImport(DataImport):
             new_attributes = []
             for attribute in attributes:
                 new_attribute = (
-                    attribute[0].decode('utf-8').lower(),
-                    attribute[1].decode('utf-8').lower(),
-                    attribute[2].decode('utf-8').lower()
+                    attribute[0].lower(),
+                    attribute[1].lower(),
+                    attribute[2].lower()
                 )
                 new_attributes.append(new_attribute)
             new_attribute_triples[table_name.lower()] = new_attributes
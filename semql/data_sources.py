@@ -1,12 +1,18 @@
+import os
 import sqlite3
+import pathlib
+import threading
 
 from abc import abstractmethod, ABC
-from typing import List, Tuple, Dict
-from contextlib import closing
+from typing import Iterator, List, Tuple, Dict
+from contextlib import closing, contextmanager, nullcontext
+from itertools import islice
 from operator import itemgetter
 
 from cuttlepool import CuttlePool
 
+from semql.schema_catalog import SchemaCatalog
+
 
 class BaseDataSource(ABC):
     _current = {}
@@ -25,8 +31,11 @@ class BaseDataSource(ABC):
 
         if not class_name in globals():
             raise ValueError(f'invalid data source class {class_name}')
-        else:
-            return globals()[class_name](config)
+        elif 'instance' not in BaseDataSource._current[key]:
+            # data sources do not hold connections, so one instance per key can be shared
+            BaseDataSource._current[key]['instance'] = globals()[class_name](config)
+
+        return BaseDataSource._current[key]['instance']
 
     @staticmethod
     def set(class_name: str, config: Dict, key: str = None) -> None:
@@ -62,164 +71,273 @@ class BaseDataSource(ABC):
     def get_data_and_project(self, table_name: str, column_names: List[str]):
         pass
 
+    def get_columns_and_project(self, table_name: str, column_names: List[str]):
+        pass
+
+    def get_rows_and_project(self, table_name: str, column_names: List[str]) -> Tuple[List[Tuple], List[str]]:
+        """
+        Same as `get_data_and_project`, but returns one tuple of values per row instead of one dict.
+        """
+        rows, columns = self.get_data_and_project(table_name, column_names)
+        return [tuple(row[col] for col in columns) for row in rows], columns
+
+    def iter_data_and_project(self, table_name: str, column_names: List[str]) -> Tuple[Iterator[Dict], List[str]]:
+        """
+        Same as `get_data_and_project`, but returns an iterator over the rows, so that callers that only need the
+        first rows can stop early. Data sources without cursors materialize the rows.
+        """
+        rows, columns = self.get_data_and_project(table_name, column_names)
+        return iter(rows), columns
+
+    def session(self):
+        """
+        Context manager that keeps one connection checked out for the current thread, so that all statements executed
+        inside of it share the connection. Data sources without connections return a no-op context.
+        """
+        return nullcontext()
+
+    def get_version(self):
+        """
+        Returns a value that changes whenever the data changes, it is used to invalidate cached results.
+        """
+        return None
+
 
 class SqliteDataSource(BaseDataSource):
-    TABLE_NAMES_SQL = "SELECT name FROM sqlite_master WHERE type='table';"
-    TABLE_ATTRS_SQL = "PRAGMA TABLE_INFO({})"
-    TABLE_REFS_SQL = "PRAGMA FOREIGN_KEY_LIST({})"
+    # number of rows fetched at once when iterating over a table
+    FETCH_SIZE = 1024
 
     def __init__(self, config: Dict):
         if 'db_path' not in config:
             raise ValueError('Missing mandatory config value "db_path"')
         else:
-            self.conn = SqliteConnectionPool.for_path(config['db_path']).get_resource()
+            self.pool = SqliteConnectionPool.for_path(config['db_path'], config.get('read_only', True))
+            self.catalog = SchemaCatalog.for_path(config['db_path'], config.get('persist_schema', False))
 
         super().__init__(config)
 
-    def get_table_names(self) -> List[str]:
-        with closing(self.conn.cursor()) as c:
-            table_names = c.execute(SqliteDataSource.TABLE_NAMES_SQL)
-            return list(map(lambda x: x[0].lower().decode('utf-8'), table_names))
+    def session(self):
+        return self.pool.session()
 
-    def get_attributes_for_tables(self) -> Dict[str, List[Tuple[bytes, bytes, str]]]:
-        table_names = self.get_table_names()
-        table_attrs = {x: [] for x in table_names}
-
-        with closing(self.conn.cursor()) as c:
-            for table in table_names:
-                foreign_keys_res = c.execute(SqliteDataSource.TABLE_REFS_SQL.format(table))
-                foreign_keys = [fk[3] for fk in foreign_keys_res]
-
-                attrs_sql = SqliteDataSource.TABLE_ATTRS_SQL.format(table)
-                attrs_res = c.execute(attrs_sql)
-                for attr in attrs_res:
-                    key_info = ''
-                    if attr[1] in foreign_keys:
-                        key_info = 'MUL'
-                    elif attr[5] > 0: # is pk?
-                        key_info = 'PRI'
-
-                    new_attr = [
-                        attr[1],  # name
-                        attr[2],  # type
-                        key_info
-                    ]
-                    table_attrs[table].append(new_attr)
-
-            return table_attrs
+    def get_version(self) -> Tuple[int, int]:
+        stat = os.stat(self.config['db_path'])
+        return stat.st_mtime_ns, stat.st_size
 
-    def get_references_for_tables(self) -> Dict:
-        table_names = self.get_table_names()
-        table_refs = {x: [] for x in table_names}
+    def get_table_names(self) -> List[str]:
+        return self.catalog.get_table_names()
 
-        with closing(self.conn.cursor()) as c:
-            for table in table_names:
-                refs_sql = SqliteDataSource.TABLE_REFS_SQL.format(table)
-                refs_res = c.execute(refs_sql)
-                table_refs[table] = [list(r[2:5]) for r in refs_res]
+    def get_attributes_for_tables(self) -> Dict[str, List[List[str]]]:
+        return self.catalog.get_attributes_for_tables()
 
-            return table_refs
+    def get_references_for_tables(self) -> Dict:
+        return self.catalog.get_references_for_tables()
 
     def get_data(self, table_name: str):
         table_names = self.get_table_names()
         if table_name not in table_names:
             raise ValueError(f'Table {table_name} does not exist')
 
-        with closing(self.conn.cursor()) as c:
-            result = c.execute(f'SELECT * FROM {table_name}')
-            columns = list(map(itemgetter(0), result.description))
-            columns = [table_name + '.' + column for column in columns]
-            result_dicts = []
-
-            for row in result:
-                row_dict = {}
-
-                for col, val in zip(columns, row):
-                    if type(val) == bytes:
-                        val = val.decode('utf-8')
-
-                    row_dict[f'{col}'] = val
-
-                result_dicts.append(row_dict)
-
-            return result_dicts, columns
+        with self.session() as conn:
+            rows, columns = self._fetch_all(conn, f'SELECT * FROM {table_name}')
+        columns = [table_name + '.' + column for column in columns]
+        return [dict(zip(columns, row)) for row in rows], columns
 
     def get_data_and_project(self, table_name: str, column_names: List[str]):
+        rows, columns = self.get_rows_and_project(table_name, column_names)
+        return [dict(zip(columns, row)) for row in rows], columns
+
+    def get_rows_and_project(self, table_name: str, column_names: List[str]) -> Tuple[List[Tuple], List[str]]:
         table_names = self.get_table_names()
         if table_name not in table_names:
             raise ValueError(f'Table {table_name} does not exist')
 
         column_string = ', '.join(['"{}"'.format(col) for col in column_names])
-        with closing(self.conn.cursor()) as c:
-            result = c.execute(f'SELECT {column_string} FROM {table_name}')
-            columns = list(map(itemgetter(0), result.description))
-            columns = [table_name + '.' + column for column in columns]
-            result_dicts = []
-
-            for row in result:
-                row_dict = {}
-
-                for col, val in zip(columns, row):
-                    if type(val) == bytes:
-                        val = val.decode('utf-8')
-
-                    row_dict[f'{col}'] = val
-
-                result_dicts.append(row_dict)
+        with self.session() as conn:
+            rows, columns = self._fetch_all(conn, f'SELECT {column_string} FROM {table_name}')
+        return rows, [table_name + '.' + column for column in columns]
+
+    def get_columns_and_project(self, table_name: str, column_names: List[str]) -> Tuple[List[List], List[str]]:
+        """
+        Same as `get_data_and_project`, but returns one list of values per column instead of one dict per row.
+        """
+        rows, columns = self.get_rows_and_project(table_name, column_names)
+        if not rows:
+            return [[] for _ in columns], columns
+        return [list(values) for values in zip(*rows)], columns
+
+    def iter_data_and_project(self, table_name: str, column_names: List[str]) -> Tuple[Iterator[Dict], List[str]]:
+        """
+        The statement is executed when the first row is requested, the cursor (and the session) is released when the
+        iterator is exhausted or closed. The rows are fetched in batches of `FETCH_SIZE`.
+        """
+        table_names = self.get_table_names()
+        if table_name not in table_names:
+            raise ValueError(f'Table {table_name} does not exist')
 
-            return result_dicts, columns
+        column_string = ', '.join(['"{}"'.format(col) for col in column_names])
+        columns = [table_name + '.' + column for column in column_names]
+        sql_statement = f'SELECT {column_string} FROM {table_name}'
+
+        def _rows():
+            with self.session() as conn:
+                yielded = 0
+                try:
+                    for row in self._fetch_batches(conn, sql_statement):
+                        yielded += 1
+                        yield dict(zip(columns, row))
+                except sqlite3.OperationalError as e:
+                    if not self._is_decode_error(e):
+                        raise
+                    # start over, replacing the invalid characters, and skip the rows that were already returned
+                    with self._replacing_text_factory(conn):
+                        for row in islice(self._fetch_batches(conn, sql_statement), yielded, None):
+                            yield dict(zip(columns, row))
+
+        return _rows(), columns
 
     def execute_sql(self, sql_statement: str):
-        cursor = self.conn.cursor()
+        rows, columns = self.execute_sql_rows(sql_statement)
+        return [dict(zip(columns, row)) for row in rows], columns
+
+    def execute_sql_rows(self, sql_statement: str) -> Tuple[List[Tuple], List[str]]:
+        """
+        Same as `execute_sql`, but returns one tuple of values per row instead of one dict.
+        """
+        with self.session() as conn:
+            try:
+                return self._fetch_all(conn, sql_statement)
+            except Exception as e:
+                conn.commit()
+                raise e
+
+    def _fetch_all(self, conn: sqlite3.Connection, sql_statement: str) -> Tuple[List[Tuple], List[str]]:
+        """
+        Executes the statement and returns all rows and the column names. Text is decoded by `sqlite3` itself, only
+        if a value is not valid UTF-8 (e.g. in the original MySQL data) the statement is executed again with a text
+        factory that replaces the invalid characters.
+        """
         try:
-            result = cursor.execute(sql_statement)
-        except Exception as e:
-            cursor.close()
-            self.conn.commit()
-            raise e
-
-        columns = list(map(itemgetter(0), result.description))
-        result_dicts = []
+            return self._fetch(conn, sql_statement)
+        except sqlite3.OperationalError as e:
+            if not self._is_decode_error(e):
+                raise
+            with self._replacing_text_factory(conn):
+                return self._fetch(conn, sql_statement)
 
-        for row in result:
-            row_dict = {}
+    @staticmethod
+    def _fetch(conn: sqlite3.Connection, sql_statement: str) -> Tuple[List[Tuple], List[str]]:
+        with closing(conn.cursor()) as c:
+            result = c.execute(sql_statement)
+            columns = list(map(itemgetter(0), result.description))
+            return result.fetchall(), columns
 
-            for col, val in zip(columns, row):
-                if type(val) == bytes:
-                    val = val.decode('utf-8')
+    @staticmethod
+    def _fetch_batches(conn: sqlite3.Connection, sql_statement: str) -> Iterator[Tuple]:
+        with closing(conn.cursor()) as c:
+            c.arraysize = SqliteDataSource.FETCH_SIZE
+            c.execute(sql_statement)
+            while True:
+                rows = c.fetchmany()
+                if not rows:
+                    return
+                yield from rows
 
-                row_dict[f'{col}'] = val
+    @staticmethod
+    def _is_decode_error(error: sqlite3.OperationalError) -> bool:
+        return 'decode' in str(error)
 
-            result_dicts.append(row_dict)
-        cursor.close()
-        return result_dicts, columns
+    @staticmethod
+    @contextmanager
+    def _replacing_text_factory(conn: sqlite3.Connection):
+        conn.text_factory = SqliteConnectionPool.decode_text
+        try:
+            yield conn
+        finally:
+            conn.text_factory = str
 
 
 class SqliteConnectionPool(CuttlePool):
     CONNECTION_POOL_CAPACITY = 10
+    # memory-map up to 256 MiB of the database file and cache up to 64 MiB of pages per connection
+    MMAP_SIZE = 256 * 1024 * 1024
+    CACHE_SIZE_KIB = 64 * 1024
 
     # We keep one connection pool per database path
     _by_path = {}
+    _by_path_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sessions = threading.local()
 
     @staticmethod
-    def for_path(db_path):
+    def for_path(db_path, read_only: bool = True):
         """Creates or returns an existing connection pool for the SQLite
-           database located at the given `db_path`."""
-        if db_path not in SqliteConnectionPool._by_path:
-            new_conn_pool = SqliteConnectionPool(
-                factory=sqlite3.connect,
-                capacity=SqliteConnectionPool.CONNECTION_POOL_CAPACITY,
-                database=db_path
-            )
-
-            SqliteConnectionPool._by_path[db_path] = new_conn_pool
+           database located at the given `db_path`. Read only pools open the
+           database as immutable, so SQLite skips all locking and change
+           detection; the file must not be modified while it is in use."""
+        key = (db_path, read_only)
+        if key not in SqliteConnectionPool._by_path:
+            with SqliteConnectionPool._by_path_lock:
+                if key not in SqliteConnectionPool._by_path:
+                    SqliteConnectionPool._by_path[key] = SqliteConnectionPool(
+                        factory=SqliteConnectionPool.connect,
+                        capacity=SqliteConnectionPool.CONNECTION_POOL_CAPACITY,
+                        database=db_path,
+                        read_only=read_only
+                    )
+
+        return SqliteConnectionPool._by_path[key]
 
-        return SqliteConnectionPool._by_path[db_path]
+    @staticmethod
+    def connect(database: str, read_only: bool = True) -> sqlite3.Connection:
+        """Opens a new connection and applies the PRAGMAs once, instead of
+           on every checkout."""
+        if read_only:
+            uri = pathlib.Path(database).absolute().as_uri() + '?mode=ro&immutable=1'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(database, check_same_thread=False)
+
+        conn.execute(f'PRAGMA mmap_size = {SqliteConnectionPool.MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size = -{SqliteConnectionPool.CACHE_SIZE_KIB}')
+        return conn
+
+    @contextmanager
+    def session(self):
+        """Checks out a connection for the current thread and returns it to
+           the pool on exit. Nested sessions of the same thread reuse the
+           connection of the outermost one."""
+        resource = getattr(self._sessions, 'resource', None)
+        if resource is not None:
+            yield resource
+            return
+
+        resource = self.get_resource()
+        self._sessions.resource = resource
+        try:
+            yield resource
+        finally:
+            self._sessions.resource = None
+            resource.close()
 
-    def normalize_resource(self, resource):
+    @staticmethod
+    def decode_text(value: bytes) -> str:
         # To prevent decoding problems with the original mysql data,
         # see https://stackoverflow.com/questions/22751363
-        resource.text_factory = bytes
+        return value.decode('utf-8', errors='replace')
+
+    @staticmethod
+    def decode_row(cursor: sqlite3.Cursor, row: Tuple) -> Tuple:
+        # BLOB values are returned as bytes, they are decoded like text
+        if bytes in map(type, row):
+            return tuple(SqliteConnectionPool.decode_text(value) if type(value) is bytes else value for value in row)
+        return row
+
+    def normalize_resource(self, resource):
+        # text is decoded natively, `SqliteDataSource` only falls back to `decode_text` for invalid UTF-8
+        resource.text_factory = str
+        resource.row_factory = SqliteConnectionPool.decode_row
 
     def ping(self, resource):
         """Checks if the given `resource` can still be used by executing a
@@ -1,42 +1,150 @@
 from abc import abstractmethod, ABC
-from typing import List, Dict
-from collections import defaultdict
+from typing import List, Dict, FrozenSet, Mapping, Sequence, Tuple
+from collections import Counter, defaultdict
 from copy import deepcopy
+from operator import itemgetter
+from types import MappingProxyType
+
+from semql.data_sources import BaseDataSource
 
 
 class OpResult(object):
     """
     Stores the results returned when calling `Operation.run()`.
+
+    The rows are immutable: they are kept in a tuple of read-only
+    `MappingProxyType` views, so operators can hand the rows of their
+    children on (or reference them from new rows) without copying.
+    Callers that need to mutate the rows have to use `copy_data()`.
+
+    Results created with `from_rows` keep their rows as tuples of values
+    instead, the dict views are only built when `get_data()` is called.
     """
 
-    def __init__(self, data_dicts: List[Dict], column_names: List[str]):
-        self._data_dicts = data_dicts
+    _multiset_cache = None
+    _dicts: Tuple[Mapping, ...] = None
+    _rows: Tuple[Tuple, ...] = None
+    _row_columns: Tuple[str, ...] = None
+
+    def __init__(self, data_dicts: Sequence[Mapping], column_names: List[str]):
+        self._data_dicts = self._freeze_rows(data_dicts)
         self._column_names = column_names
         self._validate_and_load_columns()
 
+    @staticmethod
+    def from_rows(rows: Sequence[Tuple], column_names: List[str]) -> 'OpResult':
+        """
+        Creates a result from tuples of values ordered like `column_names`, without validating them.
+        """
+        if len(set(column_names)) != len(column_names):
+            # duplicate names collapse in the dict rows, the validating constructor handles that
+            return OpResult([dict(zip(column_names, row)) for row in rows], list(column_names))
+
+        op_result = OpResult.__new__(OpResult)
+        op_result._rows = tuple(rows)
+        op_result._row_columns = tuple(column_names)
+        op_result._column_names = list(column_names)
+        return op_result
+
+    @staticmethod
+    def from_trusted(data_dicts: Sequence[Mapping], column_names: List[str]) -> 'OpResult':
+        """
+        Creates a result without validating the rows, the caller guarantees that all rows have the same keys. Like
+        the validating constructor, a non-empty result takes its columns from the keys of the rows.
+        """
+        op_result = OpResult.__new__(OpResult)
+        op_result._data_dicts = OpResult._freeze_rows(data_dicts)
+        if len(op_result._data_dicts) > 0:
+            column_names = list(op_result._data_dicts[0].keys())
+        op_result._column_names = column_names
+        return op_result
+
+    @property
+    def _data_dicts(self) -> Tuple[Mapping, ...]:
+        if self._dicts is None:
+            self._dicts = tuple(MappingProxyType(dict(zip(self._row_columns, row))) for row in self._rows)
+        return self._dicts
+
+    @_data_dicts.setter
+    def _data_dicts(self, data_dicts: Tuple[Mapping, ...]):
+        self._dicts = data_dicts
+        self._rows = None
+        self._row_columns = None
+
     def get_columns(self) -> List[str]:
         return self._column_names
 
-    def get_data(self) -> List[Dict]:
-        return deepcopy(self._data_dicts)
+    def get_data(self) -> Tuple[Mapping, ...]:
+        """
+        Returns read-only views of the rows without copying them.
+        """
+        return self._data_dicts
+
+    def get_rows(self) -> Tuple[Tuple, ...]:
+        """
+        Returns the rows as tuples of values, ordered like `get_columns()`.
+        """
+        if self._rows is not None and list(self._row_columns) == self._column_names:
+            return self._rows
+        return tuple(map(self._row_getter(self._column_names), self._data_dicts))
+
+    def copy_data(self) -> List[Dict]:
+        """
+        Returns a mutable deep copy of the rows.
+        """
+        return [deepcopy(dict(row)) for row in self._data_dicts]
+
+    def copy(self) -> 'OpResult':
+        """
+        Returns a new result that shares the (immutable) rows, but has its own list of columns.
+        """
+        op_result = OpResult.__new__(OpResult)
+        op_result._dicts = self._dicts
+        op_result._rows = self._rows
+        op_result._row_columns = self._row_columns
+        op_result._column_names = list(self._column_names)
+        op_result._multiset_cache = self._multiset_cache
+        return op_result
+
+    def head(self, limit: int) -> 'OpResult':
+        """
+        Returns a new result with the first `limit` rows, e.g. as a preview. The rows are shared.
+        """
+        op_result = OpResult.__new__(OpResult)
+        if self._rows is not None:
+            op_result._rows = self._rows[:limit]
+            op_result._row_columns = self._row_columns
+        else:
+            op_result._dicts = self._dicts[:limit]
+        op_result._column_names = list(self._column_names)
+        return op_result
 
     def get(self, idx: int) -> Dict:
-        return self._data_dicts[idx].copy()
+        if self._dicts is None:
+            return dict(zip(self._row_columns, self._rows[idx]))
+        return dict(self._dicts[idx])
 
     def __len__(self):
-        return len(self._data_dicts)
+        if self._rows is not None:
+            return len(self._rows)
+        return len(self._dicts)
 
     def __eq__(self, other):
         if not isinstance(other, OpResult):
             return NotImplemented
 
-        other_data = other._data_dicts
-        if len(self._data_dicts) != len(other_data):
+        if len(self) != len(other):
             return False
 
         if not self._is_columns_equal(other):
             return False
 
+        if set(self._column_names) == set(other._column_names):
+            # unequal fingerprints rule out equal results, only a match has to be verified
+            if self.fingerprint() != other.fingerprint():
+                return False
+            return self._row_counts() == other._row_counts()
+
         this_elements = self._elements_to_tuple(self._data_dicts, self._column_names)
         other_elements = self._elements_to_tuple(other._data_dicts, self._column_names)
 
@@ -49,10 +157,17 @@ class OpResult(object):
         if not self._is_columns_equal(other):
             return 0.0
 
-        this_elements = self._elements_to_tuple(self._data_dicts, self._column_names)
-        other_elements = self._elements_to_tuple(other._data_dicts, self._column_names)
+        if set(self._column_names) == set(other._column_names):
+            this_elements = self._row_counts()
+            other_elements = other._row_counts()
+        else:
+            this_elements = self._elements_to_tuple(self._data_dicts, self._column_names)
+            other_elements = self._elements_to_tuple(other._data_dicts, self._column_names)
 
-        number_of_intersection = len(set(this_elements).intersection(other_elements))
+        if len(this_elements) <= len(other_elements):
+            number_of_intersection = sum(1 for element in this_elements if element in other_elements)
+        else:
+            number_of_intersection = sum(1 for element in other_elements if element in this_elements)
         if len(this_elements) > 0:
             overlap = number_of_intersection/len(this_elements)
         else:
@@ -63,15 +178,63 @@ class OpResult(object):
 
         return overlap
 
+    def fingerprint(self) -> Tuple[FrozenSet[str], int, int]:
+        """
+        Returns a fingerprint of the result that does not depend on the order of the rows or columns: the columns, the
+        number of rows and the sum of the row hashes. Equal results have equal fingerprints. The fingerprint is
+        cached, so comparing a result against many others computes it only once.
+        """
+        return self._multiset()[2]
+
+    def _row_counts(self) -> Dict[Tuple, int]:
+        """
+        Returns how often every row occurs, the values of a row are ordered by the sorted column names.
+        """
+        return self._multiset()[1]
+
+    def _multiset(self):
+        columns = tuple(sorted(set(self._column_names)))
+        rows = self._rows if self._rows is not None else self._dicts
+        cache = self._multiset_cache
+        # the rows and columns of a result are replaced in place when converting SQL results, see `from_sql`
+        if cache is None or cache[0] is not rows or cache[1] != columns:
+            if self._rows is not None and set(self._row_columns) == set(columns):
+                indices = [self._row_columns.index(col) for col in columns]
+                if indices == list(range(len(indices))):
+                    row_counts = self._count(self._rows)
+                else:
+                    row_counts = self._count(map(self._row_getter(indices), self._rows))
+            else:
+                row_counts = self._elements_to_tuple(self._data_dicts, columns)
+            row_hash = sum(hash(row) * count for row, count in row_counts.items()) & 0xFFFFFFFFFFFFFFFF
+            fingerprint = (frozenset(columns), len(self), row_hash)
+            cache = self._multiset_cache = (rows, columns, row_counts, fingerprint)
+        return cache[1:]
+
     @staticmethod
     def _elements_to_tuple(data_dicts, column_names):
-        this_elements = defaultdict(lambda: 0)
-        for element in data_dicts:
-            row = []
-            for col in column_names:
-                row.append(element[col])
-            this_elements[tuple(row)] += 1
-        return this_elements
+        return OpResult._count(map(OpResult._row_getter(column_names), data_dicts))
+
+    @staticmethod
+    def _count(rows) -> Dict[Tuple, int]:
+        # `Counter` counts in C, but compares in python, so the counts are returned as plain `dict`
+        return dict(Counter(rows))
+
+    @staticmethod
+    def _row_getter(keys: Sequence):
+        """
+        Returns a function that returns the values of the given keys (or indices) of a row as tuple.
+        """
+        if len(keys) > 1:
+            return itemgetter(*keys)
+        # `itemgetter` returns a single value instead of a tuple for one key
+        return lambda row: tuple(row[key] for key in keys)
+
+    @staticmethod
+    def _freeze_rows(data_dicts: Sequence[Mapping]) -> Tuple[Mapping, ...]:
+        if data_dicts is None:
+            return ()
+        return tuple(row if type(row) is MappingProxyType else MappingProxyType(row) for row in data_dicts)
 
     def _is_columns_equal(self, other):
         for col in self._column_names:
@@ -85,7 +248,7 @@ class OpResult(object):
         contain the same column names. Raises a `ValueError` if this is
         not the case.
         """
-        if self._data_dicts is None or len(self._data_dicts) == 0:
+        if len(self._data_dicts) == 0:
             return
 
         dict_keys_count = defaultdict(lambda: 0)
@@ -111,6 +274,12 @@ class ExecutorFactory:
             return SemQLExecutor(root_node)
         elif type == 'sql':
             return SQLExecutor(root_node)
+        elif type == 'columnar':
+            from semql.columnar_execution import ColumnarExecutor  # TODO: break circular dependency on imports
+            return ColumnarExecutor(root_node)
+        elif type == 'streaming':
+            from semql.streaming_execution import StreamingExecutor  # TODO: break circular dependency on imports
+            return StreamingExecutor(root_node)
         else:
             raise ValueError('Wrong type of executor.')
 
@@ -125,6 +294,12 @@ class Executor(ABC):
     def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0):
         pass
 
+    def _session(self):
+        """
+        Returns the session of the tree's data source, so that all nodes are executed on the same connection.
+        """
+        return BaseDataSource.get(self.root_node._get_data_source_name()).session()
+
 
 class SemQLExecutor(Executor):
     """
@@ -136,7 +311,8 @@ class SemQLExecutor(Executor):
         self.result_for_node = {}
 
     def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0) -> 'OpResult':
-        result = self._dfs_run(self.root_node)
+        with self._session():
+            result = self._dfs_run(self.root_node)
 
         if not save_intermediate_result_in_nodes:
             # delete the intermediate results (so that it is equal to the sql execution)
@@ -150,8 +326,7 @@ class SemQLExecutor(Executor):
             stack = [self.root_node]
             while stack:
                 cur_node = stack.pop()
-                op_result_limited = OpResult(cur_node.op_result.get_data()[:preview_limit], cur_node.op_result.get_columns())
-                cur_node.op_result = op_result_limited
+                cur_node.op_result = cur_node.op_result.head(preview_limit)
                 stack.extend(cur_node.children)
 
         return result
@@ -175,19 +350,14 @@ class SQLExecutor(Executor):
 
     def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0):
         from semql.core.ast import IsEmpty  # TODO: break circular dependency on imports
+        from semql.result_cache import execute_sql
 
-        sql_statement = self.root_node.to_sql(save_intermediate_result_in_nodes, preview_limit)
         self.root_node._set_datasource()
         datasource = self.root_node.data_src
-        try:
-            result_dicts, columns = datasource.execute_sql(sql_statement)
-        except Exception as e:
-            if datasource is not None:
-                datasource.conn.close()
-            raise e
-        op_result = OpResult(result_dicts, columns)
-        datasource.conn.close()
-
+        # with intermediate results every node executes its own statement, they all share one connection
+        with datasource.session():
+            sql_statement = self.root_node.to_sql(save_intermediate_result_in_nodes, preview_limit)
+            op_result = execute_sql(self.root_node.data_src_name, datasource, sql_statement)
 
         # Check if the root node is an IsEmpty-Node. If so, then the last operation has to be calculated in python,
         # because SQLite doesn't know boolean data types.
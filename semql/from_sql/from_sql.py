@@ -2,6 +2,7 @@ import os, json
 
 from semql.execution import ExecutorFactory
 from semql.core.ast import *
+from semql.result_cache import execute_sql
 from semql.from_sql.process_sql import get_schemas_from_json, Schema, get_sql, AGG_OPS
 from semql.from_sql.convert_json_to_OT import Converter
 from semql_data.data_helper import get_path_to_db_file, get_metadata_filepath_for_db
@@ -19,15 +20,8 @@ def run_sql(tree: Operation):
 
 def run_raw_sql(sql_statement, db_name):
     datasource: SqliteDataSource = BaseDataSource.get(db_name)
-    try:
-        result_dicts, columns = datasource.execute_sql(sql_statement)
-    except Exception as e:
-        if datasource is not None:
-            datasource.conn.close()
-        raise e
-    op_result = OpResult(result_dicts, columns)
-    datasource.conn.close()
-    return op_result
+    # `update_cols` renames the columns in place, so the (possibly cached) result must not be shared
+    return execute_sql(db_name, datasource, sql_statement).copy()
 
 
 def update_cols(op_sql_res, table, select_labels: List):
@@ -105,8 +99,8 @@ def update_cols(op_sql_res, table, select_labels: List):
             op_sql_res._column_names[idx] = new_col_name
 
 
-    for idx in range(len(op_sql_res._data_dicts)):
-        record = op_sql_res._data_dicts[idx]
+    new_records = []
+    for record in op_sql_res.get_data():
         new_record = {}
         for key, value in record.items():
             key = key.lower()
@@ -148,8 +142,9 @@ def update_cols(op_sql_res, table, select_labels: List):
                 new_key = new_col_names[key]
                 new_record[new_key] = value
 
-        op_sql_res._data_dicts[idx] = new_record
+        new_records.append(new_record)
 
+    op_sql_res._data_dicts = OpResult._freeze_rows(new_records)
     return new_col_names
 
 
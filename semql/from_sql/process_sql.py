@@ -25,7 +25,7 @@
 ################################
 
 import json
-import sqlite3
+from semql.schema_catalog import SchemaCatalog
 from nltk import word_tokenize
 
 CLAUSE_KEYWORDS = ('select', 'from', 'where', 'group', 'order', 'limit', 'intersect', 'union', 'except')
@@ -89,21 +89,7 @@ def get_schema(db):
     :param db: database path
     :return: schema dict
     """
-
-    schema = {}
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
-
-    # fetch table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [str(table[0].lower()) for table in cursor.fetchall()]
-
-    # fetch table info
-    for table in tables:
-        cursor.execute("PRAGMA table_info({})".format(table))
-        schema[table] = [str(col[1].lower()) for col in cursor.fetchall()]
-
-    return schema
+    return SchemaCatalog.for_path(db).get_schema()
 
 
 def get_schema_from_json(fpath):
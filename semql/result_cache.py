@@ -0,0 +1,166 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from semql.data_sources import BaseDataSource
+from semql.execution import OpResult
+
+# Bump this whenever the result encoding changes, so that stale entries of the on-disk cache are not used.
+CACHE_VERSION = 2
+
+
+class ResultCache:
+    """
+    LRU cache for the results of SQL statements, keyed by `(data source, SQL text)`. The SQL generated for a subtree
+    is deterministic, so beams that compile to the same statement, or share a subtree whose intermediate result is
+    saved, reuse one execution.
+
+    The cache is bounded by the number of entries and by the total number of cells (rows times columns), results
+    with more than `max_result_rows` rows are not cached. Every entry stores the version of the data source (for
+    SQLite the modification time and size of the database file) and is dropped as soon as the version changes.
+    If a `path` is given, results are also persisted in a SQLite file and survive the process.
+    """
+
+    _current: Optional['ResultCache'] = None
+
+    def __init__(self, max_entries: int = 4096, max_cells: int = 10_000_000, max_result_rows: int = 100_000,
+                 path: str = None):
+        self.max_entries = max_entries
+        self.max_cells = max_cells
+        self.max_result_rows = max_result_rows
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._cells = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @staticmethod
+    def get_current() -> Optional['ResultCache']:
+        return ResultCache._current
+
+    @staticmethod
+    def set_current(cache: Optional['ResultCache']) -> None:
+        """
+        Sets the cache used by the executors, None disables caching.
+        """
+        ResultCache._current = cache
+
+    @staticmethod
+    def make_key(data_source_name: str, sql_statement: str) -> str:
+        content = f'{CACHE_VERSION}\0{data_source_name}\0{sql_statement}'
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _cells_of(op_result: OpResult) -> int:
+        return len(op_result) * max(len(op_result.get_columns()), 1)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, result TEXT)')
+        return self._conn
+
+    def get(self, key: str, version) -> Optional[OpResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, op_result = entry
+                if entry_version == version:
+                    self._entries.move_to_end(key)
+                    return op_result
+                self._remove(key)
+
+            if self.path is None:
+                return None
+
+            row = self._get_conn().execute('SELECT version, result FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None or row[0] != json.dumps(version):
+                return None
+            result = json.loads(row[1])
+            op_result = OpResult.from_rows(list(map(tuple, result['rows'])), result['columns'])
+            self._add(key, version, op_result)
+            return op_result
+
+    def put(self, key: str, version, op_result: OpResult):
+        if len(op_result) > self.max_result_rows:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._add(key, version, op_result)
+
+            if self.path is not None:
+                try:
+                    result = json.dumps({'rows': op_result.get_rows(), 'columns': op_result.get_columns()})
+                except (TypeError, ValueError):
+                    # e.g. bytes values, the result is only kept in memory then
+                    return
+                conn = self._get_conn()
+                conn.execute('INSERT OR REPLACE INTO results (key, version, result) VALUES (?, ?, ?)',
+                             (key, json.dumps(version), result))
+                conn.commit()
+
+    def _add(self, key: str, version, op_result: OpResult):
+        self._entries[key] = (version, op_result)
+        self._cells += self._cells_of(op_result)
+        while len(self._entries) > self.max_entries or (self._cells > self.max_cells and len(self._entries) > 1):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str):
+        _, op_result = self._entries.pop(key)
+        self._cells -= self._cells_of(op_result)
+
+    def execute(self, data_source_name: str, data_source: BaseDataSource, sql_statement: str) -> OpResult:
+        """
+        Returns the cached result of the statement or executes it on the data source and caches the result.
+        Failing statements are not cached.
+        """
+        key = self.make_key(data_source_name, sql_statement)
+        version = data_source.get_version()
+        op_result = self.get(key, version)
+        if op_result is not None:
+            self.hits += 1
+            return op_result
+
+        self.misses += 1
+        op_result = OpResult.from_rows(*data_source.execute_sql_rows(sql_statement))
+        self.put(key, version, op_result)
+        return op_result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._cells = 0
+            if self.path is not None:
+                conn = self._get_conn()
+                conn.execute('DELETE FROM results')
+                conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def execute_sql(data_source_name: str, data_source: BaseDataSource, sql_statement: str) -> OpResult:
+    """
+    Executes the statement through the current `ResultCache`, or directly if no cache is set.
+    """
+    cache = ResultCache.get_current()
+    if cache is None:
+        return OpResult.from_rows(*data_source.execute_sql_rows(sql_statement))
+    return cache.execute(data_source_name, data_source, sql_statement)
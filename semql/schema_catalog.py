@@ -0,0 +1,166 @@
+import os
+import json
+import pathlib
+import sqlite3
+import threading
+
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+# Bump this whenever the content of the catalog changes, so that stale persisted catalogs are not used.
+CATALOG_VERSION = 1
+
+
+class SchemaCatalog:
+    """
+    Schema of a SQLite database: its tables, their columns, primary keys and foreign keys. The schema is read once
+    per database file and shared by the data sources, the data import and the SQL parsing. Every access checks the
+    modification time and size of the file and reads the schema again if the file changed.
+
+    If `persist` is set, the catalog is also stored next to the database (`<db_path>.schema.json`), so that other
+    processes do not have to read the schema again.
+    """
+
+    TABLE_NAMES_SQL = "SELECT name FROM sqlite_master WHERE type='table';"
+    TABLE_ATTRS_SQL = "PRAGMA TABLE_INFO({})"
+    TABLE_REFS_SQL = "PRAGMA FOREIGN_KEY_LIST({})"
+
+    # We keep one catalog per database path
+    _by_path = {}
+    _by_path_lock = threading.Lock()
+
+    def __init__(self, db_path: str, persist: bool = False):
+        self.db_path = db_path
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._version = None
+        self._tables: Dict[str, Dict] = {}
+
+    @staticmethod
+    def for_path(db_path: str, persist: bool = False) -> 'SchemaCatalog':
+        """
+        Creates or returns the existing catalog of the database located at the given `db_path`.
+        """
+        catalog = SchemaCatalog._by_path.get(db_path)
+        if catalog is None:
+            with SchemaCatalog._by_path_lock:
+                catalog = SchemaCatalog._by_path.get(db_path)
+                if catalog is None:
+                    catalog = SchemaCatalog._by_path[db_path] = SchemaCatalog(db_path, persist)
+        return catalog
+
+    @property
+    def persist_path(self) -> str:
+        return self.db_path + '.schema.json'
+
+    def get_version(self) -> Tuple[int, int]:
+        stat = os.stat(self.db_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get_table_names(self) -> List[str]:
+        """
+        Returns the lower cased names of all tables.
+        """
+        return list(self._get_tables())
+
+    def get_columns(self, table: str) -> List[Tuple[str, str, bool]]:
+        """
+        Returns `(name, type, is primary key)` for every column of the table.
+        """
+        return [tuple(column) for column in self._get_table(table)['columns']]
+
+    def get_foreign_keys(self, table: str) -> List[Tuple[str, str, str]]:
+        """
+        Returns `(referenced table, column, referenced column)` for every foreign key of the table.
+        """
+        return [tuple(reference) for reference in self._get_table(table)['foreign_keys']]
+
+    def get_primary_keys(self, table: str) -> List[str]:
+        return [name for name, _, is_primary_key in self.get_columns(table) if is_primary_key]
+
+    def get_attributes_for_tables(self) -> Dict[str, List[List]]:
+        """
+        Returns `[name, type, key info]` for every column of every table, the key info is 'MUL' for foreign keys,
+        'PRI' for primary keys and '' otherwise.
+        """
+        table_attrs = {}
+        for table, info in self._get_tables().items():
+            foreign_keys = {reference[1] for reference in info['foreign_keys']}
+            table_attrs[table] = []
+            for name, column_type, is_primary_key in info['columns']:
+                key_info = ''
+                if name in foreign_keys:
+                    key_info = 'MUL'
+                elif is_primary_key:
+                    key_info = 'PRI'
+                table_attrs[table].append([name, column_type, key_info])
+        return table_attrs
+
+    def get_references_for_tables(self) -> Dict[str, List[List[str]]]:
+        return {table: [list(reference) for reference in info['foreign_keys']]
+                for table, info in self._get_tables().items()}
+
+    def get_schema(self) -> Dict[str, List[str]]:
+        """
+        Returns the lower cased column names of every table.
+        """
+        return {table: [column[0].lower() for column in info['columns']] for table, info in self._get_tables().items()}
+
+    def _get_table(self, table: str) -> Dict:
+        tables = self._get_tables()
+        if table not in tables:
+            raise ValueError(f'Table {table} does not exist')
+        return tables[table]
+
+    def _get_tables(self) -> Dict[str, Dict]:
+        version = self.get_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._tables = self._load(version)
+                    self._version = version
+        return self._tables
+
+    def _load(self, version: Tuple[int, int]) -> Dict[str, Dict]:
+        if self.persist:
+            tables = self._load_persisted(version)
+            if tables is not None:
+                return tables
+
+        tables = self._read_schema()
+        if self.persist:
+            self._store_persisted(version, tables)
+        return tables
+
+    def _read_schema(self) -> Dict[str, Dict]:
+        uri = pathlib.Path(self.db_path).absolute().as_uri() + '?mode=ro'
+        tables = {}
+        with closing(sqlite3.connect(uri, uri=True)) as conn:
+            table_names = [row[0].lower() for row in conn.execute(SchemaCatalog.TABLE_NAMES_SQL)]
+            for table in table_names:
+                columns = [[attr[1], attr[2], attr[5] > 0]
+                           for attr in conn.execute(SchemaCatalog.TABLE_ATTRS_SQL.format(table))]
+                foreign_keys = [list(ref[2:5]) for ref in conn.execute(SchemaCatalog.TABLE_REFS_SQL.format(table))]
+                tables[table] = {'columns': columns, 'foreign_keys': foreign_keys}
+        return tables
+
+    def _load_persisted(self, version: Tuple[int, int]) -> Optional[Dict[str, Dict]]:
+        try:
+            with open(self.persist_path, 'r') as fin:
+                persisted = json.load(fin)
+        except (OSError, ValueError):
+            return None
+        if persisted.get('catalog_version') != CATALOG_VERSION or persisted.get('version') != list(version):
+            return None
+        return persisted['tables']
+
+    def _store_persisted(self, version: Tuple[int, int], tables: Dict[str, Dict]):
+        persisted = {'catalog_version': CATALOG_VERSION, 'version': list(version), 'tables': tables}
+        tmp_path = f'{self.persist_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as fout:
+                json.dump(persisted, fout)
+            os.replace(tmp_path, self.persist_path)
+        except OSError:
+            # e.g. a read-only data directory, the catalog is just not persisted then
+            pass
@@ -1,5 +1,7 @@
 import json
-from typing import Dict
+import threading
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
 from semql_data import data_helper
 
 attributes4entity_types = 'attributes_for_entity_type.json'
@@ -35,10 +37,47 @@ databases = [
     'wta_1'
 ]
 
-attributes_for_tables = {}
-for database in databases:
-    attributes_for_tables[database] = json.load(open(
-        data_helper.get_metadata_filepath_for_db(database, attributes4entity_types)))
+
+class MetadataRegistry(Mapping):
+    """
+    Read-only mapping from database names to the content of one of their metadata files. A database's file is only
+    loaded on first access and memoized afterwards, so startup does not depend on the number of databases.
+    Databases that are not in `known_databases` are loaded as well if their metadata file exists.
+    """
+
+    def __init__(self, metadata_file: str, known_databases: List[str]):
+        self._metadata_file = metadata_file
+        self._known_databases = known_databases
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, database: str):
+        metadata = self._loaded.get(database)
+        if metadata is not None:
+            return metadata
+
+        with self._lock:
+            # another thread might have loaded the file while we were waiting for the lock
+            if database not in self._loaded:
+                self._loaded[database] = self._load(database)
+            return self._loaded[database]
+
+    def _load(self, database: str):
+        try:
+            metadata_path = data_helper.get_metadata_filepath_for_db(database, self._metadata_file)
+        except ValueError:
+            raise KeyError(database)
+        with open(metadata_path, 'r') as fin:
+            return json.load(fin)
+
+    def __iter__(self):
+        return iter(self._known_databases)
+
+    def __len__(self):
+        return len(self._known_databases)
+
+
+attributes_for_tables = MetadataRegistry(attributes4entity_types, databases)
 
 
 def wrap_statement_in_select(statement: str, preview_limit: int = 0) -> str:
@@ -65,14 +104,52 @@ def get_value_for_statement(value) -> str:
     return str(value)
 
 
+class TableSchemaIndex:
+    """
+    Precomputed metadata of a single table, so that SQL generation and execution do not have to scan the attribute
+    triples on every call.
+    """
+
+    def __init__(self, table: str, attribute_triples: List):
+        self.table = table
+        self.attributes: Tuple[str, ...] = tuple(triple[0] for triple in attribute_triples)
+        self.aliases: Tuple[str, ...] = tuple(get_attribute_alias(table, attr) for attr in self.attributes)
+        self.qualified_attributes: Tuple[str, ...] = tuple(f'{table}.{attr}' for attr in self.attributes)
+        self.primary_keys = frozenset(triple[0] for triple in attribute_triples if triple[2] == 'PRI')
+        self.attr2alias = dict(zip(self.attributes, self.aliases))
+        # e.g. 'table_id, table_name, ...'
+        self.alias_projection = ', '.join(self.aliases)
+        # e.g. '"id" AS "table_id", "name" AS "table_name", ...'
+        self.select_projection = ', '.join(escape_phrase(attr) + ' AS ' + get_value_for_statement(alias)
+                                           for attr, alias in zip(self.attributes, self.aliases))
+
+
+_table_indices = {}
+_table_indices_lock = threading.Lock()
+
+
+def get_table_index(table: str, datasource: str) -> TableSchemaIndex:
+    """
+    Returns the memoized `TableSchemaIndex` of a table, it is built on first access.
+    """
+    key = (datasource, table)
+    index = _table_indices.get(key)
+    if index is None:
+        with _table_indices_lock:
+            index = _table_indices.get(key)
+            if index is None:
+                index = TableSchemaIndex(table, attributes_for_tables[datasource][table])
+                _table_indices[key] = index
+    return index
+
+
 def get_attributes_with_aliases_for_table(table: str, datasource: str) -> Dict[str, str]:
     """
     Returns a dictionary mapping the attributes of a given table to the corresponding aliases
     :param table: The table for which the attributes and aliases should be returned.
     :return: Dictionary, which maps the attributes of a given table to the corresponding aliases
     """
-    table_attributes = attributes_for_tables[datasource][table]
-    return {triple[0]: get_attribute_alias(table, triple[0]) for triple in table_attributes}
+    return dict(get_table_index(table, datasource).attr2alias)
 
 
 def get_aliases_for_table(table: str, datasource: str) -> str:
@@ -82,14 +159,7 @@ def get_aliases_for_table(table: str, datasource: str) -> str:
     :param table: The table for which the attributes and aliases should be returned.
     :return: string of attributes and aliases
     """
-    attr2alias = get_attributes_with_aliases_for_table(table, datasource)
-    attr2alias_items = list(attr2alias.items())
-    projection = ''
-    for attr, alias in attr2alias_items[:-1]:
-        projection += alias + ', '
-    last_attr, last_alias = attr2alias_items[-1]
-    projection += last_alias
-    return projection
+    return get_table_index(table, datasource).alias_projection
 
 
 def get_attribute_alias(table: str, attr: str) -> str:
@@ -111,7 +181,7 @@ def is_attribute_primary_key(table: str, attribute: str, datasource: str) -> boo
     :param attribute:
     :return: True if attribute is a primary key, false otherwise
     """
-    return any([triple[0] == attribute and triple[2] == 'PRI' for triple in attributes_for_tables[datasource][table]])
+    return attribute in get_table_index(table, datasource).primary_keys
 
 
 def escape_phrase(phrase: str) -> str:
@@ -0,0 +1,219 @@
+from collections import defaultdict
+from itertools import chain, islice
+from typing import Callable, Dict, Iterator, List, Mapping
+
+from semql.core.ast import *
+from semql.execution import Executor, OpResult
+
+
+class RowStream:
+    """
+    The pull-based output of one node. Rows are produced only when the parent requests them, so a parent that needs
+    only the first rows stops the whole subtree early.
+
+    The stream remembers its first row (the columns of an `OpResult` are the keys of its rows, the declared columns
+    are only used for empty results) and keeps the first `keep` rows (all rows if `keep` is negative) as the
+    intermediate result of the node.
+    """
+
+    def __init__(self, rows: Iterator[Mapping], declared_columns: Callable[[], List[str]], keep: int = 0):
+        self._rows = rows
+        self._declared_columns = declared_columns
+        self.keep = keep
+        self.prefix = []
+        self.first_row = None
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Mapping:
+        try:
+            row = next(self._rows)
+        except StopIteration:
+            self.exhausted = True
+            raise
+
+        if self.first_row is None:
+            self.first_row = row
+        if self.keep < 0 or len(self.prefix) < self.keep:
+            self.prefix.append(row)
+        return row
+
+    def columns(self) -> List[str]:
+        """
+        Returns the columns the materialized result of the node would have. This pulls at most one row.
+        """
+        if self.first_row is None and not self.exhausted:
+            next(self, None)
+        if self.first_row is not None:
+            return list(self.first_row.keys())
+        return self._declared_columns()
+
+    def fill_prefix(self):
+        """
+        Pulls rows until `keep` rows are kept or the stream is exhausted.
+        """
+        while not self.exhausted and (self.keep < 0 or len(self.prefix) < self.keep):
+            next(self, None)
+
+    def close(self):
+        close = getattr(self._rows, 'close', None)
+        if close is not None:
+            close()
+
+
+class StreamingExecutor(Executor):
+    """
+    This class executes a given operation tree with a pull-based (Volcano-style) iterator model: every node is a
+    generator over the rows of its children. `GetData`, `Filter`, `Merge` (on its probe side), `ExtractValues`,
+    `Union` and `Done` stream their rows, `IsEmpty` stops after the first row. All other operations block, they
+    materialize their children and fall back to `Operation.run()`.
+
+    Without a `limit` the result is equal to the one of the `SemQLExecutor`. With a `limit` only the first `limit`
+    rows of the result are computed, so the execution stops as soon as they are found. Errors of rows that are never
+    pulled (e.g. a missing attribute) are not raised.
+    """
+
+    def __init__(self, root_node: 'Operation'):
+        super().__init__(root_node)
+        self._runners: Dict[type, Callable] = {
+            GetData: self._run_get_data,
+            Filter: self._run_filter,
+            Merge: self._run_merge,
+            ExtractValues: self._run_extract_values,
+            Union: self._run_union,
+            Done: self._run_done,
+            IsEmpty: self._run_is_empty,
+        }
+
+    def run(self, save_intermediate_result_in_nodes: bool = False, preview_limit: int = 0,
+            limit: int = 0) -> 'OpResult':
+        if not save_intermediate_result_in_nodes:
+            keep = 0
+        else:
+            keep = preview_limit if preview_limit > 0 else -1
+
+        nodes = self.root_node.list_of_nodes()
+        stream_for_node = {}
+        with self._session():
+            try:
+                root_stream = self._build(self.root_node, stream_for_node, keep)
+                rows = list(islice(root_stream, limit)) if limit > 0 else list(root_stream)
+                result = OpResult(rows, root_stream.columns())
+
+                if save_intermediate_result_in_nodes:
+                    # parents come before their children, so no node needs rows of its child after the child is filled
+                    for node in nodes:
+                        stream_for_node[id(node)].fill_prefix()
+                    for node in nodes:
+                        stream = stream_for_node[id(node)]
+                        node.op_result = OpResult(stream.prefix, stream.columns())
+            finally:
+                for stream in stream_for_node.values():
+                    stream.close()
+
+        if not save_intermediate_result_in_nodes:
+            # delete the intermediate results set by the blocking operations
+            for node in nodes:
+                node.op_result = None
+
+        return result
+
+    def _build(self, node: 'Operation', stream_for_node: Dict[int, RowStream], keep: int) -> RowStream:
+        children_streams = [self._build(child, stream_for_node, keep) for child in node.children]
+        runner = self._runners.get(type(node), self._run_blocking)
+        rows, declared_columns = runner(node, *children_streams)
+        stream = RowStream(rows, declared_columns, keep)
+        stream_for_node[id(node)] = stream
+        return stream
+
+    @staticmethod
+    def _materialize(stream: RowStream) -> OpResult:
+        return OpResult(list(stream), stream.columns())
+
+    def _run_blocking(self, node: 'Operation', *children: RowStream):
+        results = []
+
+        def _result() -> OpResult:
+            if not results:
+                for child, child_stream in zip(node.children, children):
+                    child.op_result = self._materialize(child_stream)
+                node.run()
+                results.append(node.get_result())
+            return results[0]
+
+        def _rows():
+            yield from _result().get_data()
+
+        return _rows(), lambda: _result().get_columns()
+
+    def _run_get_data(self, node: GetData):
+        node._set_datasource(node.data_source)
+        table_index = get_table_index(node.table_name, node.data_source)
+        rows, columns = node.data_src.iter_data_and_project(node.table_name, list(table_index.attributes))
+        return rows, lambda: columns
+
+    def _run_filter(self, node: Filter, child: RowStream):
+        attr_name = node.attribute_name
+        compare = Filter.OPERATOR_MAP.get(node.operation)
+
+        def _rows():
+            for row in child:
+                if attr_name not in row:
+                    raise ValueError(f'Column {attr_name} is missing')
+                elif compare is None:
+                    raise ValueError(f'Unknown comparison operator {node.operation}')
+                # there are cases where the attributes are none -> those rows are never kept
+                value = row[attr_name]
+                if value is not None and compare(value, node.value):
+                    yield row
+
+        return _rows(), child.columns
+
+    def _run_merge(self, node: Merge, left: RowStream, right: RowStream):
+        l_attr = node.attribute_name0
+        r_attr = node.attribute_name1
+
+        def _rows():
+            # the left side is the build side, the right side is probed row by row
+            attr_to_row_dict = defaultdict(list)
+            for l_row in left:
+                if l_attr not in l_row:
+                    raise ValueError(f'Missing attribute {l_attr}')
+                attr_to_row_dict[l_row[l_attr]].append(l_row)
+            if not attr_to_row_dict:
+                return
+
+            for r_row in right:
+                if r_attr not in r_row:
+                    raise ValueError(f'Missing attribute {r_attr}')
+                for l_row in attr_to_row_dict.get(r_row[r_attr], ()):
+                    yield {**l_row, **r_row}
+
+        return _rows(), lambda: left.columns() + right.columns()
+
+    def _run_extract_values(self, node: ExtractValues, child: RowStream):
+        attr_name = node.attribute_name
+
+        def _rows():
+            for row in child:
+                if attr_name not in row:
+                    raise ValueError(f'Missing attribute {attr_name}')
+                yield {attr_name: row[attr_name]}
+
+        return _rows(), lambda: []
+
+    def _run_union(self, node: Union, *children: RowStream):
+        return chain(*children), children[0].columns
+
+    def _run_done(self, node: Done, child: RowStream):
+        return child, child.columns
+
+    def _run_is_empty(self, node: IsEmpty, child: RowStream):
+        column_name = 'is_empty'
+
+        def _rows():
+            yield {column_name: next(child, None) is None}
+
+        return _rows(), lambda: [column_name]
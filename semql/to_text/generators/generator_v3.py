@@ -5,6 +5,7 @@ import re
 from collections import Counter
 
 from semql.to_text.typed_ops import *
+from semql.core.traversal import iter_leaves
 from semql.to_text.config import UNSUPPORTED_OPS
 from semql.to_text.util import (
     get_attr, get_table_name, get_attr_name, iter_nodes_by_predicate)
@@ -442,7 +443,7 @@ class RootNodeGenerator:
 
             leafs = [
                 lf
-                for lf in base_node.return_leaves()
+                for lf in iter_leaves(base_node)
                 if not self.db_meta['tables'][lf.table_name].is_relation(merge_keys)
             ]
 
@@ -1,5 +1,6 @@
 
 from semql.core.ast import *
+from semql.core.traversal import iter_leaves
 
 from semql.to_text.util import get_table_name
 
@@ -45,7 +46,7 @@ def extract_filter_chains(root: Operation):
 
     return {
         id(leaf): bottom_up(leaf=leaf)
-        for leaf in root.return_leaves()
+        for leaf in iter_leaves(root)
     }
 
 
@@ -4,6 +4,7 @@ from typing import Set
 from dataclasses import dataclass
 
 from semql.core.ast import *
+from semql.core.traversal import iter_leaves
 
 from semql.to_text.util import get_table_name, get_attr_name
 
@@ -41,7 +42,7 @@ def type_iter(t):
 def check_missing(op: Operation, db_meta: dict, merge_keys):
     provided = set()
     required = set()
-    for leaf in op.return_leaves():
+    for leaf in iter_leaves(op):
         table_name = leaf.table_name
         table = db_meta['tables'][table_name]
         required.update(table.components(merge_keys))
@@ -1,4 +1,5 @@
 from semql.core.ast import *
+from semql.core.traversal import iter_postorder, iter_leaves, first_leaf, last_leaf
 from random import choice, seed
 from semql.tree_sampling.constraints import Constraints, FilterConstraint
 from typing import Type
@@ -35,11 +36,8 @@ class ConstraintTreeGenerator:
                 choice_idx = range(len(set_op_nodes) - 1)
                 idx = choice(choice_idx)
                 leaf0, leaf1 = set_op_nodes[idx], set_op_nodes[idx + 1]
-                leaves0 = leaf0.return_leaves()
-                right_most_leaf = leaves0[-1]
-
-                leaves1 = leaf1.return_leaves()
-                left_most_leaf = leaves1[0]
+                right_most_leaf = last_leaf(leaf0)
+                left_most_leaf = first_leaf(leaf1)
                 arg0, arg1 = node_dict[right_most_leaf.table_name].neighbours[node_dict[left_most_leaf.table_name]]
                 merge = Merge(leaf0, leaf1, '{}.{}'.format(right_most_leaf.table_name, arg0),
                               '{}.{}'.format(left_most_leaf.table_name, arg1))
@@ -59,11 +57,8 @@ class ConstraintTreeGenerator:
             choice_idx = range(len(tree) - 1)
             idx = choice(choice_idx)
             leaf0, leaf1 = tree[idx], tree[idx + 1]
-            leaves0 = leaf0.return_leaves()
-            right_most_leaf = leaves0[-1]
-
-            leaves1 = leaf1.return_leaves()
-            left_most_leaf = leaves1[0]
+            right_most_leaf = last_leaf(leaf0)
+            left_most_leaf = first_leaf(leaf1)
             arg0, arg1 = node_dict[right_most_leaf.table_name].neighbours[node_dict[left_most_leaf.table_name]]
             merge = Merge(leaf0, leaf1, '{}.{}'.format(right_most_leaf.table_name, arg0), '{}.{}'.format(left_most_leaf.table_name, arg1))
 
@@ -79,8 +74,7 @@ class ConstraintTreeGenerator:
         path_to_root = filter_leaf.get_path_to_root()
         covering_operation = filter_leaf
         for operation in path_to_root:
-            leaves = operation.return_leaves()
-            if attribute_leaf in leaves:
+            if attribute_leaf in iter_leaves(operation):
                 covering_operation = operation
                 break
 
@@ -189,13 +183,7 @@ class ConstraintTreeGenerator:
         return final_op
 
     def list_of_nodes(self, tree: Operation):
-        if type(tree) in [GetData, NoOp]:
-            return [tree]
-        else:
-            nodes = []
-            for child in tree.children:
-                nodes.extend(self.list_of_nodes(child))
-            return nodes + [tree]
+        return list(iter_postorder(tree))
 
     def generate_tree_from_constraints(self):
         tree = self.generate_structure()
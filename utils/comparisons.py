@@ -1,5 +1,6 @@
 from collections import Counter
 from semql.core.ast import Operation, Merge, Filter, ProjectionRoot
+from semql.core.traversal import iter_preorder
 
 
 def str_eq(tree1: Operation, tree2: Operation) -> bool:
@@ -7,12 +8,17 @@ def str_eq(tree1: Operation, tree2: Operation) -> bool:
 
 
 def normalize_node(node: Operation):
+    """
+    Returns the label of the node used by `comp_eq`. The value of a `Filter` is lower cased in place and its cached
+    label is invalidated.
+    """
     if isinstance(node, Merge):
         min_a = min(node.attribute_name0 or "", node.attribute_name1 or "")
         max_a = max(node.attribute_name0 or "", node.attribute_name1 or "")
         return f"Merge({min_a}, {max_a})"
     if isinstance(node, Filter) and isinstance(node.value, str):
         node.value = node.value.lower()
+        node.invalidate()
         node_copy = node.shallow_copy()
         node_copy.value = 'dummy'
         return node.print_node()
@@ -28,6 +34,6 @@ def normalize_node(node: Operation):
 
 
 def comp_eq(tree1: Operation, tree2: Operation):
-    nodes1 = Counter(normalize_node(n) for n in tree1.list_of_nodes())
-    nodes2 = Counter(normalize_node(n) for n in tree2.list_of_nodes())
+    nodes1 = Counter(normalize_node(n) for n in iter_preorder(tree1))
+    nodes2 = Counter(normalize_node(n) for n in iter_preorder(tree2))
     return nodes1 == nodes2
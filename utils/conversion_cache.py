@@ -3,6 +3,7 @@ import json
 from semql.from_sql.process_sql import get_schemas_from_json, Schema, get_sql
 from semql.from_sql.convert_json_to_OT import Converter
 from semql_data.data_helper import get_metadata_filepath_for_db
+from utils.ot_cache import SQL2OTCache, DEFAULT_CACHE_PATH
 
 
 def converter_for_db(name: str):
@@ -20,27 +21,40 @@ def converter_for_db(name: str):
 
 
 class MyConvertor:
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, ot_cache: SQL2OTCache = None):
         self.db_name = db_name
-        self.conv = converter_for_db(db_name)
+        self.ot_cache = ot_cache
+        self._conv = None
+
+    @property
+    def conv(self):
+        # the converter is only built if a statement is not found in the persistent cache
+        if self._conv is None:
+            self._conv = converter_for_db(self.db_name)
+        return self._conv
+
+    def convert(self, sql_statement):
+        sql_label = get_sql(self.conv.schema, sql_statement)
+        return self.conv(sql_label)
 
     def __call__(self, sql_statement):
+        if self.ot_cache is not None:
+            return self.ot_cache.get_or_convert(self.db_name, sql_statement, self.convert)
         try:
-            sql_label = get_sql(self.conv.schema, sql_statement)
-            ot = self.conv(sql_label)
-            return ot
+            return self.convert(sql_statement)
         except Exception as e:
             return None
 
 
 class ConvertorCache:
 
-    def __init__(self):
+    def __init__(self, ot_cache_path: str = DEFAULT_CACHE_PATH):
         self.cache = {}
+        self.ot_cache = SQL2OTCache(ot_cache_path) if ot_cache_path is not None else None
 
     def get(self, db_name):
         c = self.cache.get(db_name)
         if c is None:
-            c = MyConvertor(db_name)
+            c = MyConvertor(db_name, self.ot_cache)
             self.cache[db_name] = c
-        return c
\ No newline at end of file
+        return c
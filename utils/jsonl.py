@@ -0,0 +1,102 @@
+import json
+from itertools import islice
+from typing import Dict, Iterator, List, Iterable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads_record(line: str) -> Dict:
+    """
+    Parses a single JSONL line. Uses orjson if it is installed and falls back to the json module for input orjson
+    rejects (e.g. NaN scores written by json.dumps).
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
+
+
+def dumps_record(record: Dict, fast: bool = False) -> str:
+    """
+    Serializes a record to a single JSONL line (including the newline).
+    :param fast: Use orjson if it is installed. The output is more compact than the one of json.dumps and NaN values
+                 are written as null, therefore it is only used if explicitly requested.
+    """
+    if fast and orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8') + '\n'
+    return json.dumps(record) + '\n'
+
+
+def iter_lines(fname) -> Iterator[str]:
+    """
+    Yields the non-empty lines of a JSONL file one by one, without the trailing newline.
+    """
+    with open(fname, 'rt', encoding='utf-8') as fin:
+        for line in fin:
+            line = line.rstrip('\n')
+            if line:
+                yield line
+
+
+def read_jsonl(fname) -> Iterator[Dict]:
+    """
+    Yields the records of a JSONL file one by one, so that only a single record is held in memory at a time.
+    """
+    for line in iter_lines(fname):
+        yield loads_record(line)
+
+
+def count_records(fname) -> int:
+    """
+    Counts the records of a JSONL file without parsing them, e.g. to set the total of a progress bar.
+    """
+    return sum(1 for _ in iter_lines(fname))
+
+
+def iter_batches(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    batch = list(islice(iterator, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, batch_size))
+
+
+class JsonlWriter:
+    """
+    Writes records to a JSONL file. Lines are collected in a buffer of at most `buffer_size` lines, which is flushed
+    to the file once it is full and when the writer is closed.
+    """
+
+    def __init__(self, fname, buffer_size: int = 256, fast: bool = False, append: bool = False):
+        self.fout = open(fname, 'at' if append else 'wt', encoding='utf-8')
+        self.buffer_size = buffer_size
+        self.fast = fast
+        self._buffer = []
+
+    def write(self, record: Dict):
+        self.write_line(dumps_record(record, fast=self.fast))
+
+    def write_line(self, line: str):
+        self._buffer.append(line)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.fout.writelines(self._buffer)
+        self.fout.flush()
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
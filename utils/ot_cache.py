@@ -0,0 +1,101 @@
+import os
+import re
+import sqlite3
+import hashlib
+
+from typing import Callable, Optional
+
+from semql.core.ast import Operation
+from semql.core.serialization import dump_tree, load_tree
+
+# Bump this whenever the SQL parser, the Converter or the tree encoding changes, so that stale entries are not used.
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'sql2ot.sqlite')
+
+_QUOTED_RE = re.compile(r'("[^"]*"|\'[^\']*\')')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql_statement: str) -> str:
+    """
+    Collapses whitespace outside of quoted values, so that formatting differences map to the same cache entry.
+    """
+    parts = _QUOTED_RE.split(sql_statement.strip())
+    return ''.join(part if ix % 2 == 1 else _WHITESPACE_RE.sub(' ', part) for ix, part in enumerate(parts))
+
+
+class SQL2OTCache:
+    """
+    Persistent cache for SQL to OT conversions, stored in a local SQLite file. Entries are keyed by the hash of
+    `(db_name, normalized SQL)` and hold the tree encoded by `dump_tree`, failed conversions are stored as well.
+    The connection is opened lazily, so an instance can be created before forking worker processes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._conn = None
+        self._op_classes = Operation.get_op_dict()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            # WAL allows several back-translation workers to read and write the cache concurrently
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS sql2ot (key TEXT PRIMARY KEY, tree BLOB)')
+        return self._conn
+
+    @staticmethod
+    def make_key(db_name: str, sql_statement: str) -> str:
+        content = f'{CACHE_VERSION}\0{db_name}\0{normalize_sql(sql_statement)}'
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get(self, db_name: str, sql_statement: str):
+        """
+        :return: Tuple (is_cached, tree), the tree is None if the conversion failed.
+        """
+        row = self._get_conn().execute(
+            'SELECT tree FROM sql2ot WHERE key = ?', (self.make_key(db_name, sql_statement),)).fetchone()
+        if row is None:
+            return False, None
+        if row[0] is None:
+            return True, None
+        return True, load_tree(row[0], self._op_classes)
+
+    def put(self, db_name: str, sql_statement: str, ot: Optional[Operation]):
+        tree = None if ot is None else dump_tree(ot)
+        conn = self._get_conn()
+        conn.execute('INSERT OR REPLACE INTO sql2ot (key, tree) VALUES (?, ?)',
+                     (self.make_key(db_name, sql_statement), tree))
+        conn.commit()
+
+    def get_or_convert(self, db_name: str, sql_statement: str,
+                       convert: Callable[[str], Operation]) -> Optional[Operation]:
+        """
+        Returns the cached tree for the statement or converts it with `convert` and caches the result.
+        Exceptions raised by `convert` count as a failed conversion and None is returned.
+        """
+        is_cached, ot = self.get(db_name, sql_statement)
+        if is_cached:
+            return ot
+        try:
+            ot = convert(sql_statement)
+        except LookupError as e:
+            # nltk raises a plain LookupError if its tokenizer data is missing, this is not a property of the
+            # statement and must not be persisted as a failed conversion
+            if type(e) is LookupError:
+                return None
+            ot = None
+        except Exception:
+            ot = None
+        self.put(db_name, sql_statement, ot)
+        return ot
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
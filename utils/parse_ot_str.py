@@ -1,4 +1,7 @@
+from typing import Callable, Optional
+
 from semql.core.ast import *
+from semql.core.interning import OperationInterner
 
 P1 = 'op:attr'
 P2 = 'op:attr:comp:val'
@@ -65,60 +68,74 @@ def split_args(in_str, pattern):
         pass
 
 
-def translate_str_to_OT(ot_str: str,db:str) -> Operation:
+def translate_str_to_OT(ot_str: str, db: str, interner: OperationInterner = None) -> Operation:
+    """
+    Parses the string of a tree (as returned by `print()`). If an `interner` is given, the tree is built from shared
+    nodes and every distinct subtree string is parsed only once, e.g. for all beams of one question.
+    """
+    if interner is None:
+        return _translate_str_to_OT(ot_str, db, None, _construct)
+    return interner.memoize((ot_str, db), lambda: _translate_str_to_OT(ot_str, db, interner, interner.make))
+
+
+def _construct(cls: type, *args, **kwargs) -> Operation:
+    return cls(*args, **kwargs)
+
+
+def _translate_str_to_OT(ot_str: str, db: str, interner: Optional[OperationInterner], make: Callable) -> Operation:
     op_name = ot_str.split('(')[0]
     if op_name == 'NoOp':
-        return NoOp()
+        return make(NoOp)
 
     lvl_to_inner = {lvl: in_str for lvl, in_str in parenthetic_contents(ot_str)}
     args = lvl_to_inner[0]
 
     if op_name == 'done':
-        child_op = translate_str_to_OT(args, db)
-        return Done(result=child_op)
+        child_op = translate_str_to_OT(args, db, interner)
+        return make(Done, result=child_op)
     elif op_name == 'sum':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Sum(table=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Sum, table=child_op, attribute_name=attr)
     elif op_name == 'avg':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Average(table=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Average, table=child_op, attribute_name=attr)
     elif op_name == 'count':
-        child_op = translate_str_to_OT(args, db)
-        return Count(table=child_op)
+        child_op = translate_str_to_OT(args, db, interner)
+        return make(Count, table=child_op)
     elif op_name == 'isEmpty':
-        child_op = translate_str_to_OT(args, db)
-        return IsEmpty(result=child_op)
+        child_op = translate_str_to_OT(args, db, interner)
+        return make(IsEmpty, result=child_op)
     elif op_name == 'distinct':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Distinct(result=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Distinct, result=child_op, attribute_name=attr)
     elif op_name == 'extractValues':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return ExtractValues(table=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(ExtractValues, table=child_op, attribute_name=attr)
     elif op_name == 'max':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Max(table=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Max, table=child_op, attribute_name=attr)
     elif op_name == 'min':
         child_op_str, attr = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Min(table=child_op, attribute_name=attr)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Min, table=child_op, attribute_name=attr)
     elif op_name == 'merge':
         child_op_str1, child_op_str2, attr1, attr2 = split_args(args, patterns[op_name])
-        child_op1 = translate_str_to_OT(child_op_str1, db)
-        child_op2 = translate_str_to_OT(child_op_str2, db)
-        return Merge(child_op1, child_op2, attr1, attr2)
+        child_op1 = translate_str_to_OT(child_op_str1, db, interner)
+        child_op2 = translate_str_to_OT(child_op_str2, db, interner)
+        return make(Merge, child_op1, child_op2, attr1, attr2)
     elif op_name == 'filter':
         child_op_str, attr, comp_op, val = split_args(args, patterns[op_name])
-        child_op = translate_str_to_OT(child_op_str, db)
-        return Filter(table=child_op, attribute_name=attr, operation=comp_op, value=val)
+        child_op = translate_str_to_OT(child_op_str, db, interner)
+        return make(Filter, table=child_op, attribute_name=attr, operation=comp_op, value=val)
     elif op_name == 'getData':
-        return GetData(table_name=args, data_source=db)
+        return make(GetData, table_name=args, data_source=db)
     else:
-        return NoOp()
+        return make(NoOp)
 
 
 if __name__ == '__main__':